@@ -0,0 +1,108 @@
+"""Size and speed of the cache value formats in utility.codec.
+
+Compares JSON, which Cache uses without a codec, against msgpack with and
+without compression. Values are encoded the way Cache.hash_set writes them,
+one per field of a league or player league row. Needs no services:
+    python -m benchmarks.codec [--size large] [--runs 200] [--output codec.json]
+
+With --redis the rows are also written to the Redis given by REDIS_URL, to
+measure round trips and the memory Redis reports for each hash.
+"""
+
+import argparse
+import asyncio
+from typing import Any, Dict, Optional
+
+from benchmarks.dataset import SIZES, Dataset
+from benchmarks.harness import measure, write_results
+from utility import Cache, Codec, Compression, LeagueData, PlayerLeagueData
+from utility.cache import _dump_hash, _load_hash
+
+type Results = Dict[str, Dict[str, float]]
+
+LEAGUE_KEYS = ["id", "teams", "settings"]
+PLAYER_LEAGUE_KEYS = ["player_id", "league_id", "demands", "suspension", "contract", "appointed_at", "waitlisted_at", "blacklisted"]
+
+def codecs() -> Dict[str, Optional[Codec]]:
+    formats: Dict[str, Optional[Codec]] = {"json": None}
+
+    for name, compression in (("msgpack", Compression.NONE), ("zstd", Compression.ZSTD), ("lz4", Compression.LZ4)):
+        try:
+            formats[name] = Codec(compression=compression)
+        except RuntimeError:
+            pass # Compression package not installed
+
+    return formats
+
+async def bench_encoding(rows: Dict[str, Any], runs: int) -> Results:
+    results: Results = {}
+
+    for kind, (model, keys) in rows.items():
+        for name, codec in codecs().items():
+            mapping = _dump_hash(codec, model, set(keys))
+            values = [mapping[key] for key in keys]
+
+            results[f"{kind}_{name}_size"] = {"bytes": sum(len(value) for value in values)}
+            results[f"{kind}_{name}_encode"] = await measure(lambda: _dump_hash(codec, model, set(keys)), runs=runs)
+            results[f"{kind}_{name}_decode"] = await measure(lambda: _load_hash(codec, type(model), keys, values), runs=runs)
+
+    return results
+
+async def bench_redis(rows: Dict[str, Any], runs: int) -> Results:
+    results: Results = {}
+
+    for name, codec in codecs().items():
+        cache = Cache(codec=codec)
+        await cache.connect()
+
+        try:
+            for kind, (model, keys) in rows.items():
+                identifier = f"benchmark:codec:{kind}"
+                await cache.hash_set(model, identifier=identifier, keys=keys)
+
+                memory = await cache.redis.memory_usage(f"{cache.prefix}{type(model).__name__.lower()}:{identifier}")
+                results[f"{kind}_{name}_redis_memory"] = {"bytes": memory or 0}
+                results[f"{kind}_{name}_hash_set"] = await measure(lambda: cache.hash_set(model, identifier=identifier, keys=keys), runs=runs)
+                results[f"{kind}_{name}_hash_get"] = await measure(lambda: cache.hash_get(type(model), identifier=identifier, keys=keys), runs=runs)
+
+                await cache.delete(f"{type(model).__name__.lower()}:{identifier}")
+        finally:
+            await cache.close()
+
+    return results
+
+async def run(args: argparse.Namespace) -> Results:
+    dataset = Dataset(seed=args.seed, size=args.size, leagues=1)
+    rows = {
+        "league": (LeagueData.model_validate(dict(dataset.league_rows[0])), LEAGUE_KEYS),
+        "player_league": (PlayerLeagueData.model_validate(dict(dataset.player_league_rows[0])), PLAYER_LEAGUE_KEYS),
+    }
+
+    results = await bench_encoding(rows, args.runs)
+    if args.redis:
+        results |= await bench_redis(rows, args.runs)
+
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=list(SIZES), default="large")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="Also measure round trips and memory in Redis")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    for name, stats in results.items():
+        if "bytes" in stats:
+            print(f"{name:<34} {stats['bytes']:10.0f} bytes")
+        else:
+            print(f"{name:<34} median {stats['median_us']:10.1f} us   p95 {stats['p95_us']:10.1f} us")
+
+    if args.output:
+        write_results(args.output, "codec", results, size=args.size, seed=args.seed, runs=args.runs, redis=args.redis)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json [--metric median_us] [--threshold 0.1]
+
+Exits with status 1 if any benchmark got slower than the threshold allows.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as file:
+        return json.load(file)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="median_us", help="Result field to compare, lower is better")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+
+    if base.get("parameters") != head.get("parameters"):
+        print(f"warning: runs used different parameters\n  base: {base.get('parameters')}\n  head: {head.get('parameters')}\n")
+
+    print(f"base {base.get('commit') or args.base}\nhead {head.get('commit') or args.head}\n")
+    print(f"{'benchmark':<28} {'base':>12} {'head':>12} {'change':>9}")
+
+    regressions = []
+    for name in sorted(base["results"].keys() | head["results"].keys()):
+        before = base["results"].get(name, {}).get(args.metric)
+        after = head["results"].get(name, {}).get(args.metric)
+
+        if before is None or after is None:
+            print(f"{name:<28} {before if before is not None else '-':>12} {after if after is not None else '-':>12}")
+            continue
+
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        print(f"{name:<28} {before:12.1f} {after:12.1f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Benchmark the data and IPC layers against real Postgres and Redis.
+
+Uses DATABASE_URL and REDIS_URL, so it can run in the bench service (the bot image
+built with the benchmarks included) next to the docker-compose services:
+    docker compose run --rm bench python -m benchmarks.datalayer --output head.json
+
+Only the seeded benchmark ID ranges are written to and cleared. The validation
+group needs neither service:
+    python -m benchmarks.datalayer --groups validation
+
+Compare two runs with `python -m benchmarks.compare base.json head.json`.
+"""
+
+import argparse
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, TypeVar
+
+from benchmarks.dataset import SIZES, Dataset
+from benchmarks.harness import measure, write_results
+from utility import (
+    Cache,
+    Database,
+    LeagueData,
+    PlayerLeagueData,
+    ReturnWhen,
+    get_logger,
+)
+
+logger = get_logger()
+
+GROUPS = ("validation", "cache", "database", "ipc")
+
+T = TypeVar("T")
+
+type Results = Dict[str, Dict[str, float]]
+
+def _cycle(items: List[T]) -> Callable[[], T]:
+    """Rotate through the dataset so every run doesn't hit the same key."""
+
+    iterator: Iterator[T] = itertools.cycle(items)
+    return lambda: next(iterator)
+
+async def bench_validation(dataset: Dataset, runs: int) -> Results:
+    league_row = dataset.league_rows[0]
+    player_league_rows = _cycle(dataset.player_league_rows)
+    league = LeagueData.model_validate(dict(league_row))
+
+    return {
+        "validate_league": await measure(lambda: LeagueData.model_validate(dict(league_row)), runs=runs),
+        "validate_player_league": await measure(lambda: PlayerLeagueData.model_validate(dict(player_league_rows())), runs=runs),
+        "dump_league": await measure(lambda: league.model_dump(mode="json"), runs=runs),
+        "dump_league_json": await measure(league.model_dump_json, runs=runs),
+    }
+
+async def bench_cache(dataset: Dataset, cache: Cache, runs: int) -> Results:
+    league = LeagueData.model_validate(dict(dataset.league_rows[0]))
+    league_id = str(league.id)
+    keys = {"teams", "settings"}
+
+    await cache.hash_set(league, identifier=league_id, keys=keys)
+
+    return {
+        "hash_set_league": await measure(lambda: cache.hash_set(league, identifier=league_id, keys=keys), runs=runs),
+        "hash_get_league": await measure(lambda: cache.hash_get(LeagueData, identifier=league_id, keys=keys), runs=runs),
+    }
+
+async def bench_database(dataset: Dataset, db: Database, runs: int) -> Results:
+    redis = db.cache.redis
+    results: Results = {}
+
+    league_keys = {"teams", "settings"}
+    player_keys = {"demands", "suspension", "contract"}
+
+    next_league = _cycle(dataset.league_ids)
+    next_player = _cycle(dataset.player_ids)
+    current: Dict[str, int] = {}
+
+    def pick_league() -> Awaitable[Any]:
+        current["league"] = next_league()
+        return redis.delete(f"leaguedata:{current['league']}")
+
+    def pick_player() -> Awaitable[Any]:
+        current["player"] = player_id = next_player()
+        current["league"] = dataset.league_of(player_id)
+        return redis.delete(f"playerdata:{player_id}", f"playerleaguedata:{player_id}:{current['league']}")
+
+    def fetch_league() -> Awaitable[Any]:
+        return db.fetch_league(current["league"], keys=league_keys)
+
+    def fetch_player() -> Awaitable[Any]:
+        return db.fetch_player(current["player"], current["league"], keys=player_keys)
+
+    async def drop_settings() -> None:
+        current["league"] = next_league()
+        await redis.hdel(f"leaguedata:{current['league']}", "settings")
+
+    async def drop_contract() -> None:
+        current["player"] = player_id = next_player()
+        current["league"] = dataset.league_of(player_id)
+        await redis.hdel(f"playerleaguedata:{player_id}:{current['league']}", "contract")
+
+    def warm_league() -> None:
+        current["league"] = next_league()
+
+    def warm_player() -> None:
+        current["player"] = player_id = next_player()
+        current["league"] = dataset.league_of(player_id)
+
+    results["fetch_league_cold"] = await measure(fetch_league, setup=pick_league, runs=runs)
+    results["fetch_league_warm"] = await measure(fetch_league, setup=warm_league, runs=runs)
+    results["fetch_league_partial"] = await measure(fetch_league, setup=drop_settings, runs=runs)
+
+    results["fetch_player_cold"] = await measure(fetch_player, setup=pick_player, runs=runs)
+    results["fetch_player_warm"] = await measure(fetch_player, setup=warm_player, runs=runs)
+    results["fetch_player_partial"] = await measure(fetch_player, setup=drop_contract, runs=runs)
+
+    leagues = {league_id: await db.fetch_league(league_id, keys=league_keys) for league_id in dataset.league_ids}
+
+    async def produce_existing() -> None:
+        await db.produce_player(current["player"], leagues[current["league"]], keys=player_keys)
+
+    async def produce_new() -> None:
+        await db.produce_player(dataset.new_player_id(), leagues[next_league()], keys=player_keys)
+
+    results["produce_player_existing"] = await measure(produce_existing, setup=warm_player, runs=runs)
+    results["produce_player_new"] = await measure(produce_new, runs=runs)
+
+    player_leagues: List[PlayerLeagueData] = []
+    for player_id in dataset.player_ids[:runs]:
+        player = await db.fetch_player(player_id, dataset.league_of(player_id), keys=player_keys)
+        if player:
+            player_leagues.extend(player.leagues.values())
+
+    next_league_data = _cycle(list(leagues.values()))
+    next_player_league = _cycle(player_leagues)
+
+    results["update_league"] = await measure(lambda: db.update_league(next_league_data(), keys={"settings"}), runs=runs) # type: ignore
+    results["update_player_league"] = await measure(lambda: db.update_player_league(next_player_league(), keys={"demands"}), runs=runs)
+
+    return results
+
+async def bench_ipc(sender: Cache, runs: int, wait_for: float) -> Results:
+    data = {"payload": "x" * 256}
+
+    # ALL always waits the full `wait_for`, so the interesting number is how far past it the call returns
+    return {
+        "send_message_first": await measure(lambda: sender.send_message("benchmark:echo", data, return_when=ReturnWhen.FIRST), runs=runs),
+        "send_message_all": await measure(
+            lambda: sender.send_message("benchmark:echo", data, wait_for=wait_for, return_when=ReturnWhen.ALL),
+            runs=max(1, runs // 10),
+        ),
+    }
+
+async def run(args: argparse.Namespace) -> Results:
+    dataset = Dataset(seed=args.seed, size=args.size, leagues=args.leagues)
+    results: Results = {}
+
+    if "validation" in args.groups:
+        results |= await bench_validation(dataset, args.runs)
+
+    if not set(args.groups) & {"cache", "database", "ipc"}:
+        return results
+
+    cache = Cache()
+    await cache.connect()
+
+    try:
+        if "cache" in args.groups:
+            results |= await bench_cache(dataset, cache, args.runs)
+
+        if "database" in args.groups:
+            # No expiry scheduler or change feed, their background work would skew the numbers
+            db = Database(cache, background=False)
+            await db.connect()
+
+            try:
+                await dataset.seed_database(db)
+                results |= await bench_database(dataset, db, args.runs)
+            finally:
+                await dataset.clear(db)
+                await db.close()
+
+        if "ipc" in args.groups:
+            responder = Cache()
+            await responder.connect()
+            responder.load_endpoints('benchmarks/ipc')
+
+            try:
+                await asyncio.sleep(0.5) # Let the responder subscribe
+                results |= await bench_ipc(cache, args.runs, args.wait_for)
+            finally:
+                await responder.close()
+    finally:
+        await cache.close()
+
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--size", choices=list(SIZES), default="medium")
+    parser.add_argument("--leagues", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--wait-for", type=float, default=0.05, help="wait_for used for ReturnWhen.ALL")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    for name, stats in results.items():
+        print(f"{name:<28} median {stats['median_us']:10.1f} us   p95 {stats['p95_us']:10.1f} us   {stats['ops_per_s']:10.1f} ops/s")
+
+    if args.output:
+        write_results(
+            args.output, "datalayer", results,
+            groups=args.groups, size=args.size, leagues=args.leagues, seed=args.seed, runs=args.runs, wait_for=args.wait_for,
+        )
+
+if __name__ == "__main__":
+    main()
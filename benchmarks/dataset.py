@@ -0,0 +1,176 @@
+"""Seeded synthetic leagues and players for benchmarks.
+
+The same seed and size always produce the same rows, so results from different
+commits are measured against identical data. All IDs are taken from the top of
+the bigint range, which Discord snowflakes won't reach before the 2080s, and
+`clear` only removes those ranges."""
+
+import datetime
+import random
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, get_args
+
+from utility.cache import BINARY_PREFIX
+from utility.models import SettingType
+
+if TYPE_CHECKING:
+    from utility import Database
+
+__all__ = (
+    "SIZES",
+    "Dataset",
+)
+
+# teams, settings and players per league
+SIZES: Dict[str, Tuple[int, int, int]] = {
+    "small": (8, 16, 50),
+    "medium": (32, 48, 400),
+    "large": (128, 160, 2500),
+}
+
+LEAGUE_ID_BASE = 9_000_000_000_000_000_000
+PLAYER_ID_BASE = 9_100_000_000_000_000_000
+ID_RANGE = 100_000_000_000_000_000
+
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+SETTING_TYPES: Tuple[str, ...] = get_args(SettingType.__value__)
+
+def _id_pattern(base: int) -> str:
+    """A SCAN pattern matching exactly the IDs in [base, base + ID_RANGE)."""
+
+    free_digits = len(str(ID_RANGE)) - 1
+    return str(base)[:-free_digits] + "?" * free_digits
+
+class Dataset:
+    """`leagues` leagues of the given size, with every player in exactly one league."""
+
+    def __init__(self, seed: int=0, size: str="medium", leagues: int=4) -> None:
+        if size not in SIZES:
+            raise ValueError(f"Unknown dataset size {size!r}, expected one of {', '.join(SIZES)}")
+
+        self.seed = seed
+        self.size = size
+        self.teams, self.settings, self.players_per_league = SIZES[size]
+
+        self.league_ids = [LEAGUE_ID_BASE + i for i in range(leagues)]
+        self.player_ids = [PLAYER_ID_BASE + i for i in range(leagues * self.players_per_league)]
+        self._next_player_id = PLAYER_ID_BASE + len(self.player_ids)
+
+        rng = random.Random(seed)
+        self.league_rows = [self._league(rng, league_id) for league_id in self.league_ids]
+        self.player_league_rows = [
+            self._player_league(rng, player_id, self.league_of(player_id))
+            for player_id in self.player_ids
+        ]
+
+    def league_of(self, player_id: int) -> int:
+        return self.league_ids[(player_id - PLAYER_ID_BASE) // self.players_per_league]
+
+    def new_player_id(self) -> int:
+        """An ID in the dataset range that has no rows yet, removed again by `clear`."""
+
+        self._next_player_id += 1
+        return self._next_player_id
+
+    def _league(self, rng: random.Random, league_id: int) -> Dict[str, Any]:
+        teams = {
+            f"team_{i}": {
+                "token": f"{league_id}-{i}",
+                "role_name": f"Team {i}",
+                "role_id": rng.randrange(10**17, 10**18),
+                "emoji_id": rng.randrange(10**17, 10**18) if rng.random() < 0.7 else None,
+            }
+            for i in range(self.teams)
+        }
+
+        settings = {}
+        for i in range(self.settings):
+            setting_type = SETTING_TYPES[i % len(SETTING_TYPES)]
+            settings[f"setting_{i}"] = {"value": self._setting_value(rng, setting_type), "type": setting_type}
+
+        return {"id": league_id, "teams": teams, "settings": settings}
+
+    def _setting_value(self, rng: random.Random, setting_type: str) -> Any:
+        if setting_type in ("channel", "role"):
+            return rng.randrange(10**17, 10**18)
+        if setting_type == "ping":
+            return {"key": "role", "value": [rng.randrange(10**17, 10**18) for _ in range(rng.randint(1, 3))]}
+        if setting_type in ("number", "day"):
+            return rng.randint(0, 30)
+        if setting_type == "status":
+            return rng.random() < 0.5
+        return f"{setting_type}_{rng.randint(0, 9)}"
+
+    def _player_league(self, rng: random.Random, player_id: int, league_id: int) -> Dict[str, Any]:
+        suspended = rng.random() < 0.05
+        signed = rng.random() < 0.4
+
+        return {
+            "player_id": player_id,
+            "league_id": league_id,
+            "demands": {
+                "remaining": rng.randint(0, 3),
+                "available_at": (EPOCH + datetime.timedelta(hours=rng.randint(0, 24 * 30))).isoformat(),
+            },
+            "suspension": {
+                "reason": "Benchmark suspension",
+                "until": (EPOCH + datetime.timedelta(days=rng.randint(1, 60))).isoformat(),
+                "banned": rng.random() < 0.2,
+                "proof": [f"https://example.com/{player_id}.png"],
+            } if suspended else None,
+            "contract": {
+                "team_token": f"{league_id}-{rng.randrange(self.teams)}",
+                "notes": "",
+                "salary": round(rng.uniform(0, 100), 2),
+                "length": float(rng.randint(1, 4)),
+            } if signed else None,
+            "appointed_at": EPOCH + datetime.timedelta(days=rng.randint(0, 30)) if rng.random() < 0.1 else None,
+            "waitlisted_at": None,
+            "blacklisted": rng.random() < 0.01,
+        }
+
+    async def seed_database(self, db: 'Database') -> None:
+        """Replace the dataset's rows in Postgres and drop any cached copies."""
+
+        await self.clear(db)
+
+        async with db.pool.acquire() as con:
+            async with con.transaction():
+                await con.executemany(
+                    "INSERT INTO leagues (id, teams, settings) VALUES ($1, $2, $3)",
+                    [(row["id"], row["teams"], row["settings"]) for row in self.league_rows],
+                )
+                await con.executemany("INSERT INTO players (id) VALUES ($1)", [(player_id,) for player_id in self.player_ids])
+                await con.executemany(
+                    """
+                    INSERT INTO player_leagues (player_id, league_id, demands, suspension, contract, appointed_at, waitlisted_at, blacklisted)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                    """,
+                    [
+                        (
+                            row["player_id"], row["league_id"], row["demands"], row["suspension"],
+                            row["contract"], row["appointed_at"], row["waitlisted_at"], row["blacklisted"],
+                        )
+                        for row in self.player_league_rows
+                    ],
+                )
+
+    async def clear(self, db: 'Database') -> None:
+        """Delete every row and cache key in the dataset's ID ranges."""
+
+        async with db.pool.acquire() as con:
+            await con.execute("DELETE FROM leagues WHERE id >= $1 AND id < $2", LEAGUE_ID_BASE, LEAGUE_ID_BASE + ID_RANGE)
+            await con.execute("DELETE FROM players WHERE id >= $1 AND id < $2", PLAYER_ID_BASE, PLAYER_ID_BASE + ID_RANGE)
+
+        patterns: List[str] = [
+            f"{prefix}{name}"
+            for prefix in ("", BINARY_PREFIX)
+            for name in (
+                f"leaguedata:{_id_pattern(LEAGUE_ID_BASE)}",
+                f"playerdata:{_id_pattern(PLAYER_ID_BASE)}",
+                f"playerleaguedata:{_id_pattern(PLAYER_ID_BASE)}:*",
+            )
+        ]
+        for pattern in patterns:
+            keys = [key async for key in db.cache.redis.scan_iter(match=pattern, count=1000)]
+            if keys:
+                await db.cache.redis.delete(*keys)
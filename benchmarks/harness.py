@@ -0,0 +1,86 @@
+"""Timing and result helpers shared by the benchmarks."""
+
+import datetime
+import inspect
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+__all__ = (
+    "measure",
+    "percentile",
+    "summarize",
+    "write_results",
+)
+
+type Benchmark = Callable[[], Union[Any, Awaitable[Any]]]
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Statistics in microseconds for a list of durations in seconds."""
+
+    ordered = sorted(samples)
+
+    return {
+        "runs": len(ordered),
+        "median_us": statistics.median(ordered) * 1e6,
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p95_us": percentile(ordered, 0.95) * 1e6,
+        "p99_us": percentile(ordered, 0.99) * 1e6,
+        "min_us": ordered[0] * 1e6,
+        "ops_per_s": len(ordered) / sum(ordered) if sum(ordered) else 0.0,
+    }
+
+async def measure(func: Benchmark, *, runs: int, warmup: int=5, setup: Optional[Benchmark]=None) -> Dict[str, float]:
+    """Time `runs` calls of `func`, after `warmup` untimed ones.
+
+    `setup` runs before every call and is not timed, e.g. to evict a cache
+    entry for a cold read. Both may be sync or async."""
+
+    samples: List[float] = []
+
+    for i in range(warmup + runs):
+        if setup:
+            result = setup()
+            if inspect.isawaitable(result):
+                await result
+
+        start = time.perf_counter()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        elapsed = time.perf_counter() - start
+
+        if i >= warmup:
+            samples.append(elapsed)
+
+    return summarize(samples)
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path: str, benchmark: str, results: Dict[str, Dict[str, float]], *, summary: Optional[Dict[str, Any]]=None, **parameters: Any) -> None:
+    """Write results in the format read by `benchmarks.compare`."""
+
+    with open(path, "w") as file:
+        json.dump({
+            "benchmark": benchmark,
+            "commit": _git_commit(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "parameters": parameters,
+            "summary": summary or {},
+            "results": results,
+        }, file, indent=2)
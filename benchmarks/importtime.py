@@ -0,0 +1,62 @@
+"""Measure import time of the utility package with `python -X importtime`.
+
+Run from the repository root:
+    python -m benchmarks.importtime [--runs 5] [--output importtime.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+SCENARIOS: Dict[str, str] = {
+    "utility": "import utility",
+    "utility.get_logger": "from utility import get_logger",
+    "utility.Cache": "from utility import Cache",
+    "utility.Database": "from utility import Database",
+    "utility.*": "from utility import *",
+    "discover_endpoints": "from utility import discover_endpoints; discover_endpoints('peerless/ipc')",
+}
+
+def measure(statement: str) -> int:
+    """Total cumulative import time in microseconds of the top-level imports made by `statement`."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True,
+    )
+
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+
+        # Nested imports are indented, and already counted in their parent's cumulative time
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+
+    return total
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, statement in SCENARIOS.items():
+        samples: List[int] = [measure(statement) for _ in range(args.runs)]
+        results[name] = {"median_us": statistics.median(samples), "min_us": min(samples)}
+
+        print(f"{name:<24} median {results[name]['median_us'] / 1000:8.1f} ms   min {results[name]['min_us'] / 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"benchmark": "importtime", "python": sys.version, "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from utility import RedisCommand
+
+class EchoMessage(BaseModel):
+    payload: str
+
+class EchoCommand(RedisCommand):
+    CHANNEL = 'benchmark:echo'
+    MODEL = EchoMessage
+
+    async def handle(self, context: EchoMessage) -> Optional[Dict[str, Any]]:
+        return {"payload": context.payload}
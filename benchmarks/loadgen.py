@@ -0,0 +1,323 @@
+"""Drive simulated command traffic through the real Database and Cache classes.
+
+Requests are started at a fixed target rate whether or not earlier ones have
+finished, and latency is measured from when a request was due to start, so a
+backed up process shows up as latency instead of as a lower request rate.
+Leagues and players within a league are picked with a Zipf distribution, so a
+few busy leagues receive most of the traffic like they do in production.
+
+Run next to the docker-compose services, with the pool sizes under test:
+    docker compose run --rm -e DB_POOL_SIZE=10 bench python -m benchmarks.loadgen --rate 200 --duration 30
+    docker compose run --rm bench python -m benchmarks.loadgen --search --slo-p99 0.5 --output load.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from benchmarks.dataset import PLAYER_ID_BASE, SIZES, Dataset
+from benchmarks.harness import percentile, write_results
+from utility import Cache, Database, ReturnWhen, get_logger, offloader
+
+logger = get_logger()
+
+DEFAULT_MIX = "produce_player=50,fetch_league=30,update_player_league=15,ipc=5"
+
+LEAGUE_KEYS = {"teams", "settings"}
+PLAYER_KEYS = {"demands", "suspension", "contract"}
+
+class Zipf:
+    """Draws indexes in [0, n) where index k has weight 1 / (k + 1) ** s."""
+
+    def __init__(self, n: int, s: float, rng: random.Random) -> None:
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+class Workload:
+    """The operations a bot process runs for incoming commands, weighted by `mix`."""
+
+    def __init__(self, db: Database, dataset: Dataset, mix: Dict[str, float], skew: float, seed: int) -> None:
+        self.db = db
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+
+        self.leagues = Zipf(len(dataset.league_ids), skew, self.rng)
+        self.players = Zipf(dataset.players_per_league, skew, self.rng)
+
+        operations: Dict[str, Callable[[], Awaitable[None]]] = {
+            "produce_player": self.produce_player,
+            "fetch_league": self.fetch_league,
+            "update_player_league": self.update_player_league,
+            "ipc": self.ipc,
+        }
+        unknown = mix.keys() - operations.keys()
+        if unknown:
+            raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+
+        self.names = list(mix)
+        self.operations = [operations[name] for name in self.names]
+        self.weights = [mix[name] for name in self.names]
+
+    def choose(self) -> Tuple[str, Callable[[], Awaitable[None]]]:
+        i = self.rng.choices(range(len(self.names)), weights=self.weights)[0]
+        return self.names[i], self.operations[i]
+
+    def _pick(self) -> Tuple[int, int]:
+        league = self.leagues.sample()
+        player = PLAYER_ID_BASE + league * self.dataset.players_per_league + self.players.sample()
+        return self.dataset.league_ids[league], player
+
+    async def fetch_league(self) -> None:
+        league_id, _ = self._pick()
+        if not await self.db.fetch_league(league_id, keys=LEAGUE_KEYS):
+            raise LookupError(f"League {league_id} is missing")
+
+    async def produce_player(self) -> None:
+        league_id, player_id = self._pick()
+        league = await self.db.produce_league(league_id, keys=LEAGUE_KEYS)
+        await self.db.produce_player(player_id, league, keys=PLAYER_KEYS)
+
+    async def update_player_league(self) -> None:
+        league_id, player_id = self._pick()
+        player = await self.db.fetch_player(player_id, league_id, keys=PLAYER_KEYS)
+
+        if not player or not (player_league := player.leagues.get(league_id)):
+            raise LookupError(f"Player {player_id} is missing from league {league_id}")
+
+        player_league.demands.remaining = self.rng.randint(0, 3)
+        await self.db.update_player_league(player_league, keys={"demands"})
+
+    async def ipc(self) -> None:
+        response = await self.db.cache.send_message("benchmark:echo", {"payload": "ping"}, return_when=ReturnWhen.FIRST)
+        if response[0].data is None:
+            raise TimeoutError("No IPC reply")
+
+class Step:
+    """Latencies and errors collected while running at one rate."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Counter[str] = Counter()
+        self.error_types: Counter[str] = Counter()
+        self.dropped = 0
+        self.attempted = 0
+        self.elapsed = 0.0
+
+    @property
+    def completed(self) -> int:
+        return sum(len(samples) for samples in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return (sum(self.errors.values()) + self.dropped) / self.attempted if self.attempted else 0.0
+
+    def stats(self, samples: List[float], errors: int, attempted: int) -> Dict[str, float]:
+        ordered = sorted(samples)
+        return {
+            "runs": len(ordered),
+            "errors": errors,
+            "error_rate": errors / attempted if attempted else 0.0,
+            "throughput": len(ordered) / self.elapsed if self.elapsed else 0.0,
+            "median_us": percentile(ordered, 0.50) * 1e6 if ordered else 0.0,
+            "p95_us": percentile(ordered, 0.95) * 1e6 if ordered else 0.0,
+            "p99_us": percentile(ordered, 0.99) * 1e6 if ordered else 0.0,
+        }
+
+    def p99(self) -> float:
+        ordered = sorted(itertools.chain.from_iterable(self.latencies.values()))
+        return percentile(ordered, 0.99) if ordered else 0.0
+
+    def results(self) -> Dict[str, Dict[str, float]]:
+        results = {
+            f"{self.rate:g}/{name}": self.stats(samples, self.errors[name], len(samples) + self.errors[name])
+            for name, samples in self.latencies.items()
+        }
+        results[f"{self.rate:g}/all"] = self.stats(
+            list(itertools.chain.from_iterable(self.latencies.values())),
+            sum(self.errors.values()) + self.dropped,
+            self.attempted,
+        )
+        return results
+
+async def run_step(workload: Workload, rate: float, duration: float, max_in_flight: int) -> Step:
+    loop = asyncio.get_running_loop()
+    step = Step(rate)
+    in_flight: Set[asyncio.Task[None]] = set()
+
+    async def execute(name: str, operation: Callable[[], Awaitable[None]], due: float) -> None:
+        try:
+            await operation()
+        except Exception as e:
+            step.errors[name] += 1
+            step.error_types[type(e).__name__] += 1
+        else:
+            step.latencies.setdefault(name, []).append(loop.time() - due)
+
+    start = loop.time()
+    for i in range(int(rate * duration)):
+        due = start + i / rate
+        if (delay := due - loop.time()) > 0:
+            await asyncio.sleep(delay)
+
+        step.attempted += 1
+        if len(in_flight) >= max_in_flight:
+            step.dropped += 1
+            continue
+
+        task = asyncio.create_task(execute(*workload.choose(), due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+    step.elapsed = loop.time() - start
+    return step
+
+def saturated(step: Step, args: argparse.Namespace) -> bool:
+    return (
+        step.p99() > args.slo_p99
+        or step.error_rate > args.max_error_rate
+        or step.throughput < step.rate * 0.95
+    )
+
+def report(step: Step, args: argparse.Namespace) -> None:
+    print(
+        f"{step.rate:8.1f}/s  achieved {step.throughput:8.1f}/s  p99 {step.p99() * 1000:8.1f} ms  "
+        f"errors {step.error_rate:6.2%}  dropped {step.dropped}{'  SATURATED' if saturated(step, args) else ''}"
+    )
+
+    if step.error_types:
+        print(f"          {', '.join(f'{name}: {count}' for name, count in step.error_types.most_common())}")
+
+async def search(workload: Workload, args: argparse.Namespace, steps: List[Step]) -> Optional[float]:
+    """Increase the rate geometrically until the process saturates, then bisect between the last good and first bad rate."""
+
+    good: Optional[float] = None
+    bad: Optional[float] = None
+    rate = args.rate
+
+    while rate <= args.max_rate:
+        step = await run_step(workload, rate, args.duration, args.max_in_flight)
+        steps.append(step)
+        report(step, args)
+
+        if saturated(step, args):
+            bad = rate
+            break
+
+        good = rate
+        rate *= args.step
+
+    for _ in range(args.refine if good and bad else 0):
+        rate = (good + bad) / 2 # type: ignore
+        step = await run_step(workload, rate, args.duration, args.max_in_flight)
+        steps.append(step)
+        report(step, args)
+
+        if saturated(step, args):
+            bad = rate
+        else:
+            good = rate
+
+    return good
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    return {name.strip(): float(weight) for name, weight in (part.split("=") for part in mix.split(",") if part)}
+
+async def run(args: argparse.Namespace) -> Tuple[List[Step], Optional[float], Dict[str, Any]]:
+    dataset = Dataset(seed=args.seed, size=args.size, leagues=args.leagues)
+
+    cache = Cache()
+    await cache.connect()
+
+    responder = Cache()
+    await responder.connect()
+    responder.load_endpoints('benchmarks/ipc')
+
+    # No expiry scheduler or change feed, their background work would skew the numbers
+    db = Database(cache, background=False)
+    await db.connect()
+
+    config = {
+        "db_pool_size": db.pool_size,
+        "redis_max_connections": cache.max_connections,
+        "offload_executor": offloader.executor,
+    }
+    steps: List[Step] = []
+    saturation: Optional[float] = None
+
+    try:
+        await dataset.seed_database(db)
+        workload = Workload(db, dataset, parse_mix(args.mix), args.skew, args.seed)
+
+        if args.warmup:
+            await run_step(workload, args.rate, args.warmup, args.max_in_flight)
+
+        if args.search:
+            saturation = await search(workload, args, steps)
+        else:
+            step = await run_step(workload, args.rate, args.duration, args.max_in_flight)
+            steps.append(step)
+            report(step, args)
+    finally:
+        await dataset.clear(db)
+        await db.close()
+        await responder.close()
+        await cache.close()
+
+    return steps, saturation, config
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second, or the starting rate with --search")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run each rate for")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unrecorded traffic to fill the caches first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. produce_player=50,fetch_league=30")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for league and player popularity")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--leagues", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Requests over this are dropped and counted as errors")
+    parser.add_argument("--search", action="store_true", help="Find the highest rate that stays within the limits below")
+    parser.add_argument("--step", type=float, default=1.5, help="Rate multiplier between search steps")
+    parser.add_argument("--max-rate", type=float, default=10000.0)
+    parser.add_argument("--refine", type=int, default=3, help="Bisection steps after the first saturated rate")
+    parser.add_argument("--slo-p99", type=float, default=0.5, help="p99 latency in seconds above which a rate is saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    started = time.time()
+    steps, saturation, config = asyncio.run(run(args))
+
+    if args.search:
+        print(f"\nSaturation: {f'{saturation:.1f} requests/s' if saturation else 'no sustainable rate found'}")
+
+    if args.output:
+        results: Dict[str, Dict[str, float]] = {}
+        for step in steps:
+            results |= step.results()
+
+        write_results(
+            args.output, "loadgen", results,
+            summary={"saturation_rate": saturation, "wall_seconds": time.time() - started, **config},
+            rate=args.rate, duration=args.duration, mix=args.mix, skew=args.skew, size=args.size,
+            leagues=args.leagues, seed=args.seed, search=args.search, slo_p99=args.slo_p99,
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Memory and validation cost of the embedded value types in utility.models.
+
+Compares the slotted pydantic dataclasses against equivalent pydantic models,
+which is how they were defined before. Needs no services:
+    python -m benchmarks.valueobjects [--count 10000] [--runs 200] [--output valueobjects.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import gc
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from benchmarks.dataset import Dataset
+from benchmarks.harness import measure, write_results
+from utility import ContractData, DemandData, PlayerLeagueData, SuspensionData
+
+class PydanticDemandData(BaseModel):
+    remaining: int
+    available_at: datetime.datetime
+
+class PydanticSuspensionData(BaseModel):
+    reason: Optional[str]
+    until: datetime.datetime
+    banned: bool
+    proof: Optional[List[str]]
+
+class PydanticContractData(BaseModel):
+    team_token: str
+    notes: str
+    salary: Optional[float]
+    length: float
+
+PAIRS: Dict[str, Dict[str, Type[Any]]] = {
+    "demands": {"slots": DemandData, "pydantic": PydanticDemandData},
+    "suspension": {"slots": SuspensionData, "pydantic": PydanticSuspensionData},
+    "contract": {"slots": ContractData, "pydantic": PydanticContractData},
+}
+
+def bytes_per_object(build: Callable[[], List[Any]]) -> float:
+    """Average memory allocated per object while building and keeping them alive."""
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    objects = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+
+    tracemalloc.stop()
+    return allocated / len(objects)
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    dataset = Dataset(seed=args.seed, size="large", leagues=max(1, args.count // 2500))
+    rows = dataset.player_league_rows[:args.count]
+    results: Dict[str, Dict[str, float]] = {}
+
+    for field, classes in PAIRS.items():
+        values = [row[field] for row in rows if row[field]]
+
+        for kind, cls in classes.items():
+            adapter = TypeAdapter(List[cls])
+            validated = adapter.validate_python(values)
+
+            results[f"{field}_{kind}_memory"] = {
+                "bytes_per_object": bytes_per_object(lambda: adapter.validate_python(values)),
+                "objects": len(values),
+            }
+            results[f"{field}_{kind}_validate"] = await measure(lambda: adapter.validate_python(values), runs=args.runs)
+            results[f"{field}_{kind}_dump_json"] = await measure(lambda: adapter.dump_json(validated), runs=args.runs)
+
+    # Whole rows, the way Database and Cache validate them
+    player_leagues = TypeAdapter(List[PlayerLeagueData])
+    results["player_league_rows_validate"] = await measure(lambda: player_leagues.validate_python([dict(row) for row in rows]), runs=args.runs)
+    results["player_league_rows_memory"] = {
+        "bytes_per_object": bytes_per_object(lambda: player_leagues.validate_python([dict(row) for row in rows])),
+        "objects": len(rows),
+    }
+
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="Player league rows to take values from")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    for name, stats in results.items():
+        if "bytes_per_object" in stats:
+            print(f"{name:<34} {stats['bytes_per_object']:10.1f} bytes/object   ({stats['objects']} objects)")
+        else:
+            print(f"{name:<34} median {stats['median_us']:10.1f} us   p95 {stats['p95_us']:10.1f} us")
+
+    if args.output:
+        write_results(args.output, "valueobjects", results, count=args.count, runs=args.runs, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,24 @@
-import asyncio
-
-from utility import Cache, ReturnWhen, get_logger
+from utility import Cache, LoopLagMonitor, ReturnWhen, get_logger, run
 
 logger = get_logger()
 
 async def main():
     cache = Cache()
 
+    if monitor := LoopLagMonitor.from_env():
+        monitor.start()
+
     await cache.connect()
     cache.load_endpoints('dashboard/ipc')
     
     resp = await cache.send_message("test", {"message": "Hello, World!"}, return_when=ReturnWhen.FIRST)
     print(resp, flush=True)
 
+    if monitor:
+        monitor.stop()
+
     await cache.close()
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    # Offload workers are spawned and import this module again
+    run(main())
\ No newline at end of file
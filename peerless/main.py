@@ -1,17 +1,15 @@
-import asyncio
-
-from utility import Cache, get_logger
+from peerless.worker import main
+from utility import get_env, get_logger
 
 logger = get_logger()
 
-async def main():
-    cache = Cache()
-
-    await cache.connect()
-    cache.load_endpoints('peerless/ipc')
-
-    await cache._task
-
-    await cache.close()
+if __name__ == "__main__":
+    shard_count = get_env("SHARD_COUNT", "")
+    shard_ids = get_env("SHARD_IDS", "")
+    metrics_port = get_env("METRICS_PORT", "")
 
-asyncio.run(main())
\ No newline at end of file
+    main(
+        [int(x) for x in shard_ids.split(",")] if shard_ids else None,
+        int(shard_count) if shard_count else None,
+        metrics_port=int(metrics_port) if metrics_port else None,
+    )
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.context import SpawnProcess
+from multiprocessing.sharedctypes import Synchronized
+from typing import Any, List, Optional
+
+from peerless.worker import HEARTBEAT_INTERVAL, main
+from utility import get_env, get_logger
+from utility.cache import DEDICATED_CONNECTIONS
+from utility.offload import offloader
+
+logger = get_logger()
+
+ctx = multiprocessing.get_context("spawn")
+
+CHECK_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = HEARTBEAT_INTERVAL * 6
+STABLE_AFTER = 60.0
+MAX_BACKOFF = 60.0
+
+class Worker:
+    def __init__(self, id: int, shard_ids: List[int]) -> None:
+        self.id = id
+        self.shard_ids = shard_ids
+        self.heartbeat: Synchronized = ctx.Value("d", 0.0)
+
+        self.process: Optional[SpawnProcess] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_at = 0.0
+
+class Supervisor:
+    """Run one bot process per shard group and keep them alive.
+
+    Workers are restarted with exponential backoff when they exit or stop
+    sending heartbeats. The connection budgets are split between workers so
+    the whole machine stays within the Postgres and Redis limits. Each worker's
+    dedicated Redis connections come out of its share before its pool is sized.
+    The offload budget is split the same way, so the machine runs that many
+    offload processes in total rather than that many per worker."""
+
+    def __init__(
+        self, workers: int, shard_count: int, db_pool_budget: int, redis_pool_budget: int, offload_budget: int,
+        metrics_port: Optional[int]=None
+    ) -> None:
+        self.shard_count = shard_count
+        # The worker elected to listen for changes holds one pool connection for it
+        self.db_pool_size = max(2, db_pool_budget // workers)
+        self.redis_pool_size = max(1, redis_pool_budget // workers - DEDICATED_CONNECTIONS)
+        self.offload_workers = max(1, offload_budget // workers)
+        self.metrics_port = metrics_port
+
+        self.workers = [
+            Worker(id=i, shard_ids=list(range(i, shard_count, workers)))
+            for i in range(workers)
+        ]
+        self.stopping = False
+
+    def start(self, worker: Worker) -> None:
+        worker.heartbeat.value = time.monotonic()
+        worker.process = ctx.Process(
+            target=_run,
+            name=f"peerless-worker-{worker.id}",
+            args=(worker.shard_ids, self.shard_count, self.db_pool_size, self.redis_pool_size, self.offload_workers),
+            kwargs={
+                "metrics_port": self.metrics_port + worker.id if self.metrics_port else None,
+                "heartbeat": worker.heartbeat,
+            },
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+
+        logger.info(f"Started worker {worker.id} (pid {worker.process.pid}) for shards {worker.shard_ids}")
+
+    def check(self, worker: Worker) -> None:
+        process = worker.process
+        now = time.monotonic()
+
+        if process is None:
+            if now >= worker.restart_at:
+                self.start(worker)
+            return
+
+        if process.is_alive():
+            if now - worker.heartbeat.value > HEARTBEAT_TIMEOUT:
+                logger.error(f"Worker {worker.id} missed its heartbeats, killing it")
+                process.kill()
+            elif worker.restarts and now - worker.started_at > STABLE_AFTER:
+                worker.restarts = 0
+            return
+
+        process.join()
+        logger.error(f"Worker {worker.id} exited with code {process.exitcode}")
+
+        backoff = min(MAX_BACKOFF, 2 ** worker.restarts)
+        worker.restarts += 1
+        worker.restart_at = now + backoff
+        worker.process = None
+
+        logger.info(f"Restarting worker {worker.id} in {backoff:.0f}s")
+
+    def stop(self, *_: Any) -> None:
+        self.stopping = True
+
+    def run(self, drain_timeout: float=30.0) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for worker in self.workers:
+            self.start(worker)
+
+        while not self.stopping:
+            for worker in self.workers:
+                self.check(worker)
+            time.sleep(CHECK_INTERVAL)
+
+        self.shutdown(drain_timeout)
+
+    def shutdown(self, drain_timeout: float) -> None:
+        logger.info("Stopping workers")
+        processes = [worker.process for worker in self.workers if worker.process and worker.process.is_alive()]
+
+        # Workers drain their in-flight requests on SIGTERM
+        for process in processes:
+            process.terminate()
+
+        deadline = time.monotonic() + drain_timeout + 5
+        for process in processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+def _run(shard_ids: List[int], shard_count: int, db_pool_size: int, redis_pool_size: int, offload_workers: int, **kwargs: Any) -> None:
+    # Read by Database and Cache when they are created in this process
+    os.environ["DB_POOL_SIZE"] = str(db_pool_size)
+    os.environ["REDIS_POOL_SIZE"] = str(redis_pool_size)
+
+    # The offloader was configured on import, but its pool only starts on first use
+    offloader.max_workers = offload_workers
+
+    main(shard_ids, shard_count, **kwargs)
+
+if __name__ == "__main__":
+    # Unset variables are passed through docker-compose as empty strings
+    workers = int(get_env("WORKERS", "") or multiprocessing.cpu_count())
+    metrics_port = get_env("METRICS_PORT", "")
+
+    Supervisor(
+        workers=workers,
+        shard_count=int(get_env("SHARD_COUNT", "") or workers),
+        db_pool_budget=int(get_env("DB_POOL_BUDGET", "") or 40),
+        redis_pool_budget=int(get_env("REDIS_POOL_BUDGET", "") or 200),
+        # OFFLOAD_WORKERS is the total across workers here, each worker gets its share
+        offload_budget=int(get_env("OFFLOAD_WORKERS", "") or multiprocessing.cpu_count()),
+        metrics_port=int(metrics_port) if metrics_port else None,
+    ).run()
@@ -0,0 +1,84 @@
+import asyncio
+import signal
+import time
+from multiprocessing.sharedctypes import Synchronized
+from typing import Iterable, Optional
+
+from utility import Cache, Database, LoopLagMonitor, get_env, get_logger, metrics, offloader, run
+
+logger = get_logger()
+
+HEARTBEAT_INTERVAL = 5.0
+
+async def _heartbeat(value: Synchronized) -> None:
+    while True:
+        value.value = time.monotonic()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+async def run_worker(
+    shard_ids: Optional[Iterable[int]]=None,
+    shard_count: Optional[int]=None,
+    *,
+    metrics_port: Optional[int]=None,
+    heartbeat: Optional[Synchronized]=None,
+    drain_timeout: float=30.0,
+) -> None:
+    """Run one bot process until it is told to stop, then drain in-flight requests."""
+
+    cache = Cache()
+    db = Database(cache, background=True)
+    loop = asyncio.get_running_loop()
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    if metrics_port:
+        await metrics.serve(port=metrics_port)
+
+    exporter = None
+    if path := get_env("METRICS_FILE", ""):
+        exporter = asyncio.create_task(metrics.export_to_file(path))
+
+    beat = asyncio.create_task(_heartbeat(heartbeat)) if heartbeat is not None else None
+
+    if monitor := LoopLagMonitor.from_env():
+        monitor.start()
+
+    # Registered first, so the listener subscribes to them as soon as it starts
+    cache.load_endpoints('peerless/ipc')
+
+    if shard_count:
+        cache.register_shards(shard_ids if shard_ids is not None else range(shard_count), shard_count)
+
+    await cache.connect()
+    await db.connect()
+
+    # Stop on a signal, or if the listener dies
+    stopper = asyncio.create_task(stop.wait())
+    await asyncio.wait([cache._task, stopper], return_when=asyncio.FIRST_COMPLETED)
+    stopper.cancel()
+
+    logger.info("Shutting down, draining in-flight requests")
+    await cache.drain(timeout=drain_timeout)
+
+    for task in (exporter, beat):
+        if task:
+            task.cancel()
+
+    if monitor:
+        monitor.stop()
+
+    await db.close()
+    await cache.close()
+    await metrics.close()
+    offloader.close()
+
+def main(
+    shard_ids: Optional[Iterable[int]]=None,
+    shard_count: Optional[int]=None,
+    *,
+    metrics_port: Optional[int]=None,
+    heartbeat: Optional[Synchronized]=None,
+) -> None:
+    run(run_worker(shard_ids, shard_count, metrics_port=metrics_port, heartbeat=heartbeat))
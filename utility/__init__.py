@@ -1,8 +1,76 @@
-from .cache import *
-from .database import *
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
 from .env import *
-from .ipcmodels import *
 from .logger import *
-from .models import *
+from .loopmonitor import *
 from .namespace import *
-from .schema import *
+from .prometheus import *
+
+if TYPE_CHECKING:
+    from .cache import *
+    from .changefeed import *
+    from .codec import *
+    from .database import *
+    from .endpoints import *
+    from .ipcmodels import *
+    from .models import *
+    from .offload import *
+    from .scheduler import *
+    from .schema import *
+    from .tracing import *
+
+# Modules that pull in heavy dependencies (pydantic, redis, asyncpg, sqlalchemy, discord)
+# are imported on first access, so a process only pays for what it uses
+_lazy_exports: Dict[str, str] = {
+    "Cache": ".cache",
+    "ChangeFeed": ".changefeed",
+    "Codec": ".codec",
+    "Compression": ".codec",
+    "Database": ".database",
+    "Endpoint": ".endpoints",
+    "discover_endpoints": ".endpoints",
+    "ReturnWhen": ".ipcmodels",
+    "RedisMessage": ".ipcmodels",
+    "RedisRequest": ".ipcmodels",
+    "RedisResponse": ".ipcmodels",
+    "RedisCommand": ".ipcmodels",
+    "TraceContext": ".ipcmodels",
+    "LeagueData": ".models",
+    "SettingData": ".models",
+    "TeamData": ".models",
+    "RolePing": ".models",
+    "GlobalPing": ".models",
+    "PlayerData": ".models",
+    "PlayerLeagueData": ".models",
+    "DemandData": ".models",
+    "SuspensionData": ".models",
+    "ContractData": ".models",
+    "SettingType": ".models",
+    "DEFAULT_DEMANDS": ".models",
+    "Offloader": ".offload",
+    "offloader": ".offload",
+    "Scheduler": ".scheduler",
+    "Table": ".schema",
+    "Span": ".tracing",
+    "Tracer": ".tracing",
+    "tracer": ".tracing",
+    "traced": ".tracing",
+}
+
+__all__ = tuple(
+    name
+    for module in (".env", ".logger", ".loopmonitor", ".namespace", ".prometheus")
+    for name in importlib.import_module(module, __name__).__all__
+) + tuple(_lazy_exports)
+
+def __getattr__(name: str) -> Any:
+    if (module_name := _lazy_exports.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_lazy_exports))
@@ -1,13 +1,31 @@
 import asyncio
-import importlib
-import importlib.util
+import dataclasses
+import functools
+import inspect
 import json
+import logging
 import os
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type, Union
+import socket
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 from redis.asyncio.client import PubSub, Redis
+from redis.asyncio.connection import BlockingConnectionPool
+from redis.exceptions import ResponseError
 from tenacity import (
     retry,
     retry_if_not_exception_type,
@@ -15,6 +33,8 @@ from tenacity import (
     wait_exponential,
 )
 
+from .codec import Codec
+from .endpoints import Endpoint, discover_endpoints
 from .env import get_env
 from .ipcmodels import (
     RedisCommand,
@@ -25,6 +45,9 @@ from .ipcmodels import (
 )
 from .logger import get_logger
 from .models import LeagueData, PlayerData, PlayerLeagueData
+from .offload import offloader
+from .prometheus import metrics, timed
+from .tracing import tracer
 
 __all__ = (
     "Cache",
@@ -32,29 +55,178 @@ __all__ = (
 
 logger = get_logger()
 
+_latency = metrics.histogram("peerless_cache_operation_seconds", "Latency of cache and IPC operations", ["operation"])
+_in_flight = metrics.gauge("peerless_cache_in_flight", "Cache and IPC operations currently running", ["operation"])
+_lookups = metrics.counter("peerless_cache_lookups", "Hash cache lookups by result", ["result"])
+_ipc_timeouts = metrics.counter("peerless_ipc_timeouts", "IPC requests that timed out waiting for a reply").labels()
+
+_hash_hit = _lookups.labels(result="hit")
+_hash_partial = _lookups.labels(result="partial")
+_hash_miss = _lookups.labels(result="miss")
+
+# Commands wait this long for a free pooled connection instead of failing right away
+POOL_TIMEOUT = 5.0
+DEFAULT_POOL_SIZE = 50
+
+# The pub/sub subscription and the blocking stream reads hold a connection each for as
+# long as the process runs, so they are opened outside the pool
+DEDICATED_CONNECTIONS = 2
+
+# Redis Streams transport for endpoints with STREAM = True
+STREAM_GROUP = "peerless"
+STREAM_BATCH = 32
+STREAM_BLOCK_MS = 5000
+STREAM_MAXLEN = 10000
+STREAM_CLAIM_IDLE_MS = 60000
+STREAM_MAX_DELIVERIES = 3
+STREAM_DEAD_MAXLEN = 1000
+STREAM_RETRY_DELAY = 5.0
+
+# Shard-aware routing, requests for a league go only to the process owning its guild
+SHARD_COUNT_KEY = "ipc:shard_count"
+SHARD_COUNT_TTL = 30.0
+
+# Shard owners keep the key alive, so it disappears once no process owns shards anymore
+SHARD_COUNT_EXPIRY = 60
+SHARD_COUNT_REFRESH = 20.0
+
+def _shard_for(guild_id: int, shard_count: int) -> int:
+    # Same formula Discord uses to assign guilds to shards
+    return (guild_id >> 22) % shard_count
+
+def _shard_channel(channel: str, shard_id: int) -> str:
+    return f"{channel}:shard:{shard_id}"
+
+# Values written by a Codec are kept apart from JSON ones, since a client without a
+# codec decodes every reply as text and would fail on the binary values
+BINARY_PREFIX = "bin:"
+
+# Names of the value formats, in the order value_keys returns their keys
+VALUE_FORMATS = ("json", "binary")
+
+def value_keys(name: str) -> Tuple[str, str]:
+    """Every key a cached value may be stored under, one per value format."""
+
+    return (name, BINARY_PREFIX + name)
+
+# Client-side batching of IPC requests
+BATCH_WINDOW = 0.005
+BATCH_MAX_SIZE = 64
+RESPONSE_CACHE_MAX_SIZE = 1024
+
+def _merge_chunks(chunks: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reassemble streamed reply chunks. Lists are concatenated, dicts merged, anything else is overwritten."""
+
+    merged: Dict[str, Any] = {}
+    for chunk in chunks:
+        for key, value in chunk.items():
+            current = merged.get(key)
+
+            if isinstance(current, list) and isinstance(value, list):
+                current.extend(value)
+            elif isinstance(current, dict) and isinstance(value, dict):
+                current.update(value)
+            else:
+                merged[key] = value
+
+    return merged
+
+def _encode_hash(codec: Optional[Codec], values: Dict[str, Any]) -> Dict[str, Union[str, bytes]]:
+    dumps = codec.encode if codec else json.dumps
+    return {key: dumps(value) for key, value in values.items()}
+
+def _dump_hash(codec: Optional[Codec], model: PydanticBaseModel, keys: Set[str]) -> Dict[str, Union[str, bytes]]:
+    return _encode_hash(codec, model.model_dump(mode="json", include=keys))
+
+def _load_hash[T: PydanticBaseModel](codec: Optional[Codec], model_cls: Type[T], keys: List[str], values: List[Any]) -> Tuple[T, Set[str]]:
+    loads = codec.decode if codec else json.loads
+    mapping: Dict[str, Any] = {}
+    unretrieved: Set[str] = set()
+
+    for key, value in zip(keys, values):
+        if value is None:
+            unretrieved.add(key)
+            continue
+
+        try:
+            mapping[key] = loads(value)
+        except ValueError:
+            # Written in another value format, refetch it from the database
+            unretrieved.add(key)
+
+    return (model_cls.model_validate(mapping), unretrieved)
+
+@functools.cache
+def _adapter(model_cls: Type[Any]) -> TypeAdapter[Any]:
+    return TypeAdapter(model_cls)
+
+@functools.cache
+def _list_adapter(model_cls: Type[Any]) -> TypeAdapter[List[Any]]:
+    return TypeAdapter(List[model_cls])
+
+def _validates(model_cls: Type[Any]) -> bool:
+    # Anything else is built by calling it, since pydantic can't generate a schema for plain classes
+    return isinstance(model_cls, type) and (issubclass(model_cls, PydanticBaseModel) or dataclasses.is_dataclass(model_cls))
+
 class Cache:
-    def __init__(self) -> None:
+    def __init__(self, codec: Optional[Codec]=None, max_connections: Optional[int]=None) -> None:
         self.loop = asyncio.get_running_loop()
+        self.codec = codec
+        self.prefix = BINARY_PREFIX if codec else ""
+        self.value_format = VALUE_FORMATS[1] if codec else VALUE_FORMATS[0]
+
+        pool_size = get_env("REDIS_POOL_SIZE", "")
+        self.max_connections = max_connections or (int(pool_size) if pool_size else None)
 
         self.responses: Dict[str, List[RedisResponse]] = {}
         self.futures: Dict[str, asyncio.Future[RedisResponse]] = {}
-        self.endpoints: List[RedisCommand[PydanticBaseModel]] = []
+        self.queues: Dict[str, asyncio.Queue[RedisResponse]] = {}
+        self.partials: Dict[Tuple[str, Optional[str]], List[RedisResponse]] = {}
+
+        self._batches: Dict[Tuple[str, Optional[int], bool], List[Tuple[Dict[str, Any], float, asyncio.Future[RedisResponse]]]] = {}
+        self._batch_timers: Dict[Tuple[str, Optional[int], bool], asyncio.TimerHandle] = {}
+        self._response_cache: OrderedDict[Tuple[str, Optional[int], str], Tuple[float, RedisResponse]] = OrderedDict()
+        self.endpoints: List[Endpoint] = []
+
+        self.shard_ids: List[int] = []
+        self.shard_count: Optional[int] = None
+        self._routes: Dict[str, Endpoint] = {}
+        self._streams: Dict[str, str] = {}
+        self._unrouted = False
+        self._known_shard_count: Optional[int] = None
+        self._shard_count_checked = 0.0
+
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
 
         self.redis: Redis
         self.pubsub: PubSub
+        self._dedicated: Redis
         self._task: asyncio.Task[None]
+        self._consumer_task: Optional[asyncio.Task[None]] = None
+        self._shard_task: Optional[asyncio.Task[None]] = None
+        self._handlers: Set[asyncio.Task[None]] = set()
+        self._draining = False
 
     async def connect(self) -> None:
         if hasattr(self, 'redis'):
             return
         
-        self.redis = Redis.from_url(
+        options: Dict[str, Any] = {
+            "decode_responses": self.codec is None,
+            "health_check_interval": 60,
+            "retry_on_timeout": True,
+        }
+
+        pool = BlockingConnectionPool.from_url(
             get_env("REDIS_URL"),
-            decode_responses=True,
-            health_check_interval=60,
-            retry_on_timeout=True,
+            max_connections=self.max_connections or DEFAULT_POOL_SIZE,
+            timeout=POOL_TIMEOUT,
+            **options,
         )
-        self.pubsub = self.redis.pubsub()
+        self.redis = Redis(connection_pool=pool)
+
+        self._dedicated = Redis.from_url(get_env("REDIS_URL"), max_connections=DEDICATED_CONNECTIONS, **options)
+        self.pubsub = self._dedicated.pubsub()
 
         await self._verify_connection()
         self._task = asyncio.create_task(self.listen())
@@ -77,50 +249,101 @@ class Cache:
             logger.error("Failed to connect to Redis")
             raise ConnectionError(f"Failed to connect to Redis: {e}") from e
 
+    async def drain(self, timeout: float=30.0) -> None:
+        """Stop accepting requests and wait for the ones being handled to finish."""
+
+        self._draining = True
+
+        if self._consumer_task:
+            # The consumer finishes its current batch, unfinished entries are claimed by another consumer
+            await asyncio.wait([self._consumer_task], timeout=timeout)
+
+        if self._handlers:
+            logger.info(f"Waiting for {len(self._handlers)} requests to finish")
+            await asyncio.wait(self._handlers, timeout=timeout)
+
     async def close(self) -> None:
+        if self._consumer_task:
+            self._consumer_task.cancel()
+
+        if self._shard_task:
+            self._shard_task.cancel()
+
+            # Senders go back to broadcasting, which any remaining shard owner still receives
+            try:
+                await self.redis.delete(SHARD_COUNT_KEY)
+            except Exception as e:
+                logger.error("Failed to remove the shard count", exc_info=e)
+
         if hasattr(self, 'redis'):
             await self.pubsub.unsubscribe()
             await self.pubsub.close()
             
             await self.redis.connection_pool.disconnect()
             await self.redis.close()
+            await self._dedicated.connection_pool.disconnect()
+            await self._dedicated.close()
 
             logger.info("Closed Redis connection")
 
     def load_endpoints(self, folder_path: str) -> None:
-        for dirpath, _, files in os.walk(folder_path):
-            for file in files:
-                if not file.endswith('.py'):
-                    continue
-                
-                module_path = os.path.join(dirpath, file).replace(os.sep, '.').replace('/', '.')[:-3]
+        """Register the commands under `folder_path`. Their modules are imported on the first message."""
 
-                spec = importlib.util.find_spec(module_path)
-                if not spec:
-                    raise FileNotFoundError(f"Couldn't find '{module_path}'")
-                
-                if not spec.loader:
-                    # No idea what spec.loader is, but I don't think it will ever be None
-                    # This is just to satisfy the type checker
-                    raise ImportError(f"Module '{module_path}' has no loader")
+        for endpoint in discover_endpoints(folder_path):
+            logger.info(f"Registered command {endpoint.name!r} on channel {endpoint.CHANNEL!r}")
+            self.endpoints.append(endpoint)
 
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
+        self._unrouted = True
 
-                commands: List[Type[RedisCommand[PydanticBaseModel]]] = [
-                    obj for obj in module.__dict__.values() if isinstance(obj, type) and issubclass(obj, RedisCommand) and obj is not RedisCommand
-                ]
+    def register_shards(self, shard_ids: Iterable[int], shard_count: int) -> None:
+        """Declare the shards this process owns."""
 
-                for cmd in commands:
-                    logger.info(f"Loading command {cmd.__name__!r} on channel {cmd.CHANNEL!r}")
-                    self.endpoints.append(cmd(self))
+        self.shard_ids = sorted(shard_ids)
+        self.shard_count = shard_count
+        self._unrouted = True
+        logger.info(f"Registered shards {self.shard_ids} of {shard_count}")
 
-    async def listen(self) -> None:
-        channels = [x.CHANNEL for x in self.endpoints]
+    async def _route(self) -> None:
+        """Subscribe to the channels of endpoints and shards registered since the last call."""
+
+        routes: Dict[str, Endpoint] = {}
+        for endpoint in self.endpoints:
+            # The plain channel stays subscribed for broadcasts
+            routes[endpoint.CHANNEL] = endpoint
+            for shard_id in self.shard_ids:
+                routes[_shard_channel(endpoint.CHANNEL, shard_id)] = endpoint
+
+        added = {channel: endpoint for channel, endpoint in routes.items() if channel not in self._routes}
+        self._routes.update(added)
+
+        if self.shard_count and self._shard_task is None:
+            self._shard_task = asyncio.create_task(self._advertise_shards())
+
+        channels = [channel for channel, endpoint in added.items() if not endpoint.STREAM]
         if channels:
             await self.pubsub.subscribe(*channels)
 
+        streamed = [channel for channel, endpoint in added.items() if endpoint.STREAM]
+        if streamed and self._consumer_task is None:
+            self._consumer_task = asyncio.create_task(self.consume(streamed))
+        elif streamed:
+            # The running consumer reads every stream in self._streams on its next pass
+            streams = {f"stream:{channel}": ">" for channel in streamed}
+            await self._create_groups(streams)
+            self._streams.update(streams)
+
+    async def listen(self) -> None:
         while True:
+            # Endpoints and shards can be registered before or after the listener starts
+            if self._unrouted:
+                self._unrouted = False
+                await self._route()
+
+            if not self.pubsub.subscribed:
+                # Nothing to read until a channel is subscribed to, e.g. a process that only sends requests
+                await asyncio.sleep(0.1)
+                continue
+
             message_data = await self.pubsub.get_message(ignore_subscribe_messages=True)
 
             if message_data is None:
@@ -138,46 +361,396 @@ class Cache:
             if 'reply' in message.channel.lower():
                 resp = RedisResponse.model_validate(message.data)
 
+                if resp.trace:
+                    tracer.record_interval("ipc.reply", resp.trace, resp.trace.sent_at, time.time_ns(), channel=message.channel)
+
+                if message.channel in self.queues:
+                    self.queues[message.channel].put_nowait(resp)
+                    continue
+
+                if not resp.final or resp.seq:
+                    resp = self._reassemble(message.channel, resp)
+                    if resp is None:
+                        continue
+
                 if message.channel in self.responses:
-                    logger.debug(f"Responded to reply for {message.channel!r}")
+                    logger.debug("Responded to reply for %r", message.channel)
                     self.responses[message.channel].append(resp)
                 elif message.channel in self.futures:
-                    logger.debug(f"Responded to reply for {message.channel!r}")
+                    logger.debug("Responded to reply for %r", message.channel)
                     future = self.futures.pop(message.channel)
                     future.set_result(resp)
+            elif not self._draining:
+                task = asyncio.create_task(self.handle(message))
+                self._handlers.add(task)
+                task.add_done_callback(self._handlers.discard)
+
+    async def _advertise_shards(self) -> None:
+        while True:
+            try:
+                await self.redis.set(SHARD_COUNT_KEY, self.shard_count, ex=SHARD_COUNT_EXPIRY) # type: ignore
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to refresh the shard count", exc_info=e)
+
+            await asyncio.sleep(SHARD_COUNT_REFRESH)
+
+    def _reassemble(self, channel: str, response: RedisResponse) -> Optional[RedisResponse]:
+        key = (channel, response.origin)
+        chunks = self.partials.setdefault(key, [])
+
+        if not response.final:
+            chunks.append(response)
+            return None
+
+        self.partials.pop(key)
+        chunks.sort(key=lambda x: x.seq)
+
+        return RedisResponse(
+            data=_merge_chunks(x.data for x in chunks if x.data),
+            origin=response.origin,
+            trace=response.trace,
+        )
+
+    def _drop_partials(self, channel: str) -> None:
+        for key in [x for x in self.partials if x[0] == channel]:
+            self.partials.pop(key)
+
+    async def consume(self, channels: List[str]) -> None:
+        """Handle requests for stream endpoints as part of a consumer group.
+
+        Each request is delivered to a single consumer in the group and acknowledged
+        once handled. Requests left unacknowledged by a crashed consumer are claimed
+        again after STREAM_CLAIM_IDLE_MS. A request still failing after
+        STREAM_MAX_DELIVERIES attempts is moved to the stream's ":dead" stream.
+        If Redis fails, for example the connection drops or the stream was evicted,
+        the consumer recreates its groups and starts over."""
+
+        streams = self._streams
+        streams.update({f"stream:{channel}": ">" for channel in channels})
+
+        while not self._draining:
+            try:
+                await self._create_groups(streams)
+                await self._consume(streams)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Stream consumer failed, restarting", exc_info=e)
+                await asyncio.sleep(STREAM_RETRY_DELAY)
+
+    async def _create_groups(self, streams: Dict[str, str]) -> None:
+        for key in list(streams):
+            try:
+                await self.redis.xgroup_create(key, STREAM_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def _consume(self, streams: Dict[str, str]) -> None:
+        last_claim = 0.0
+
+        while not self._draining:
+            if time.monotonic() - last_claim > STREAM_CLAIM_IDLE_MS / 1000:
+                last_claim = time.monotonic()
+
+                for key in list(streams):
+                    await self._claim(key)
+
+            entries = await self._dedicated.xreadgroup(STREAM_GROUP, self.consumer, streams, count=STREAM_BATCH, block=STREAM_BLOCK_MS) # type: ignore
+            for key, messages in entries or []:
+                await self._handle_entries(key.decode() if isinstance(key, bytes) else key, messages)
+
+    async def _claim(self, key: str) -> None:
+        """Take over requests another consumer left unacknowledged, unless they were already attempted too often."""
+
+        _, claimed, *_ = await self.redis.xautoclaim(key, STREAM_GROUP, self.consumer, min_idle_time=STREAM_CLAIM_IDLE_MS, count=STREAM_BATCH)
+        if not claimed:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entry_id, _ in claimed:
+                pipe.xpending_range(key, STREAM_GROUP, min=entry_id, max=entry_id, count=1)
+            pending = await pipe.execute()
+
+        # Claiming counts as a delivery, so this is the number of attempts including the one about to be made
+        deliveries = {info["message_id"]: info["times_delivered"] for infos in pending for info in infos}
+        retry, dead = [], []
+
+        for entry in claimed:
+            (dead if deliveries.get(entry[0], 0) > STREAM_MAX_DELIVERIES else retry).append(entry)
+
+        if dead:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for entry_id, fields in dead:
+                    if fields:
+                        pipe.xadd(f"{key}:dead", {**fields, "id": entry_id}, maxlen=STREAM_DEAD_MAXLEN, approximate=True)
+                pipe.xack(key, STREAM_GROUP, *[entry_id for entry_id, _ in dead])
+                await pipe.execute()
+
+            logger.warning(f"Moved {len(dead)} requests on {key!r} to the dead letter stream after {STREAM_MAX_DELIVERIES} attempts")
+
+        await self._handle_entries(key, retry)
+
+    async def _handle_entries(self, key: str, entries: List[Tuple[Any, Optional[Dict[Any, Any]]]]) -> None:
+        channel = key.removeprefix("stream:")
+
+        # XAUTOCLAIM on Redis 6.2 returns entries deleted from the stream without their fields
+        handled = [entry_id for entry_id, fields in entries if not fields]
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+
+        results = await asyncio.gather(*(
+            self.handle(RedisMessage(type="stream", pattern=None, channel=channel, data=fields.get("data", fields.get(b"data"))))
+            for _, fields in entries
+        ), return_exceptions=True)
+
+        for (entry_id, _), result in zip(entries, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to handle stream entry {entry_id!r} on {key!r}", exc_info=result)
             else:
-                asyncio.create_task(self.handle(message))
+                handled.append(entry_id)
+
+        # Failed entries stay pending and are claimed again later
+        if handled:
+            await self.redis.xack(key, STREAM_GROUP, *handled)
+
+    async def _get_shard_count(self) -> Optional[int]:
+        if time.monotonic() - self._shard_count_checked > SHARD_COUNT_TTL:
+            count = await self.redis.get(SHARD_COUNT_KEY)
+            self._known_shard_count = int(count) if count else None
+            self._shard_count_checked = time.monotonic()
+
+        return self._known_shard_count
 
+    @timed(_latency.labels(operation="handle"), in_flight=_in_flight.labels(operation="handle"))
     async def handle(self, message: RedisMessage) -> None:
         request = RedisRequest.model_validate(message.data)
-        command = next((x for x in self.endpoints if x.CHANNEL == message.channel), None)
+        endpoint = self._routes.get(message.channel)
 
-        if command:
-            logger.debug(f"Handling command for channel {message.channel!r}")
-            response_data = await command.handle(command.MODEL.model_validate(request.data))
-            response = RedisResponse(data=response_data)
-        else:
-            response = RedisResponse(data=None)
+        try:
+            command = endpoint.load(self) if endpoint else None
+        except Exception as e:
+            # The caller would otherwise wait out its timeout with no hint of what went wrong
+            logger.error(f"Failed to load the command for channel {message.channel!r}", exc_info=e)
+            await self.redis.publish(
+                channel = f"reply:{request.nonce}",
+                message = RedisResponse(data=None, origin=self.consumer, error=f"{type(e).__name__}: {e}").model_dump_json()
+            )
+            return
+
+        if request.trace:
+            tracer.record_interval("ipc.queue", request.trace, request.trace.sent_at, time.time_ns(), channel=message.channel)
+
+        with tracer.span("ipc.handle", parent=request.trace, channel=message.channel):
+            if command and request.batch is not None:
+                logger.debug("Handling batch of %d commands for channel %r", len(request.batch), message.channel)
+                results = await asyncio.gather(*(self._run_command(command, data) for data in request.batch), return_exceptions=True)
+
+                # A failed item gets no reply, the rest of the batch is still answered
+                for i, result in enumerate(results):
+                    if isinstance(result, BaseException):
+                        logger.error(f"Failed to handle item {i} of a batch for channel {message.channel!r}", exc_info=result)
+                        results[i] = None
+
+                response = RedisResponse(data=None, batch=results, origin=self.consumer)
+            elif command:
+                logger.debug("Handling command for channel %r", message.channel)
+                result = command.handle(command.MODEL.model_validate(request.data))
+
+                if inspect.isasyncgen(result):
+                    response = await self._publish_chunks(f"reply:{request.nonce}", result)
+                else:
+                    response = RedisResponse(data=await result, origin=self.consumer)
+            else:
+                response = RedisResponse(data=None, origin=self.consumer)
+
+            if request.trace:
+                response.trace = tracer.context()
 
         await self.redis.publish(
             channel = f"reply:{request.nonce}",
             message = response.model_dump_json()
         )
-        logger.debug(f"Sent response for {message.channel!r}")
+        logger.debug("Sent response for %r", message.channel)
 
-    async def send_message(self, channel: str, data: Dict[str, Any], wait_for: float=1.5, return_when: ReturnWhen=ReturnWhen.ALL) -> List[RedisResponse]:
-        request = RedisRequest(data=data)
+    async def _run_command(self, command: RedisCommand[PydanticBaseModel], data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = command.handle(command.MODEL.model_validate(data))
+
+        # Batched replies are sent in one message, so streamed chunks are reassembled here
+        if inspect.isasyncgen(result):
+            return _merge_chunks([chunk async for chunk in result])
+        return await result
+
+    async def _publish_chunks(self, reply: str, chunks: AsyncIterator[Dict[str, Any]]) -> RedisResponse:
+        """Publish each chunk of a streaming handler as it is produced, and return the final message to send."""
+
+        seq = 0
+        async for chunk in chunks:
+            await self.redis.publish(
+                channel = reply,
+                message = RedisResponse(data=chunk, seq=seq, final=False, origin=self.consumer).model_dump_json()
+            )
+            seq += 1
+
+        return RedisResponse(data=None, seq=seq, final=True, origin=self.consumer)
+
+    async def _publish_request(self, channel: str, request: RedisRequest, league_id: Optional[int], stream: bool) -> bool:
+        """Subscribe to the reply channel and publish the request. Returns whether it was routed to a single shard.
+
+        `stream` has to match the STREAM attribute of the command on `channel`."""
+
+        target = channel
+
+        if league_id is not None and (shard_count := await self._get_shard_count()):
+            target = _shard_channel(channel, _shard_for(league_id, shard_count))
 
         await self.pubsub.subscribe(f"reply:{request.nonce}")
-        await self.redis.publish(
-            channel = channel,
-            message = request.model_dump_json()
-        )
+        request.trace = tracer.context()
+
+        if stream:
+            await self.redis.xadd(f"stream:{target}", {"data": request.model_dump_json()}, maxlen=STREAM_MAXLEN, approximate=True)
+        else:
+            await self.redis.publish(
+                channel = target,
+                message = request.model_dump_json()
+            )
+
+        return target != channel
 
-        if return_when == ReturnWhen.FIRST:
-            return [await self.wait_for_reply(request, timeout=wait_for)]
-        return await self.wait_for_replies(request, wait_for=wait_for)
+    @timed(_latency.labels(operation="send_message"), in_flight=_in_flight.labels(operation="send_message"))
+    async def send_message(
+        self, channel: str, data: Dict[str, Any], wait_for: float=1.5, return_when: ReturnWhen=ReturnWhen.ALL, *,
+        league_id: Optional[int]=None, stream: bool=False
+    ) -> List[RedisResponse]:
+        """Send a request to the commands on `channel`. Pass `stream=True` for commands with STREAM = True."""
+
+        with tracer.span("ipc.send", channel=channel):
+            request = RedisRequest(data=data)
+
+            # Only the process owning the league's shard can reply, so there's nothing else to wait for
+            if await self._publish_request(channel, request, league_id, stream):
+                return_when = ReturnWhen.FIRST
+
+            if return_when == ReturnWhen.FIRST:
+                return [await self.wait_for_reply(request, timeout=wait_for)]
+            return await self.wait_for_replies(request, wait_for=wait_for)
+
+    async def stream_message(
+        self, channel: str, data: Dict[str, Any], timeout: float=1.5, *, league_id: Optional[int]=None, stream: bool=False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Send a request and yield the reply chunks of the first responder as they arrive.
+
+        `timeout` applies to each chunk rather than the whole reply."""
+
+        request = RedisRequest(data=data)
+        reply = f"reply:{request.nonce}"
+
+        queue: asyncio.Queue[RedisResponse] = asyncio.Queue()
+        self.queues[reply] = queue
+
+        origin: Optional[str] = None
+        try:
+            with tracer.span("ipc.stream", channel=channel):
+                await self._publish_request(channel, request, league_id, stream)
+
+            while True:
+                try:
+                    response = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    _ipc_timeouts.inc()
+                    return
+
+                if origin is None:
+                    origin = response.origin
+                elif response.origin != origin:
+                    continue # Another responder, only the first one is streamed
+
+                if response.error:
+                    logger.warning(f"Request on channel {channel!r} failed: {response.error}")
+
+                if response.data is not None:
+                    yield response.data
+
+                if response.final:
+                    return
+        finally:
+            self.queues.pop(reply, None)
+            await self.pubsub.unsubscribe(reply)
     
+    async def send_batched(
+        self, channel: str, data: Dict[str, Any], wait_for: float=1.5, *,
+        league_id: Optional[int]=None, stream: bool=False, cache_ttl: Optional[float]=None
+    ) -> RedisResponse:
+        """Send a request coalesced with other requests to the same channel made within BATCH_WINDOW.
+
+        Resolves with the first responder's reply, like ReturnWhen.FIRST. `stream` is the same as
+        for send_message. Pass `cache_ttl` for idempotent commands to serve identical requests
+        from a local response cache."""
+
+        cache_key = None
+        if cache_ttl:
+            cache_key = (channel, league_id, json.dumps(data, sort_keys=True, default=str))
+
+            if cached := self._response_cache.get(cache_key):
+                if cached[0] > time.monotonic():
+                    self._response_cache.move_to_end(cache_key)
+                    return cached[1]
+
+                del self._response_cache[cache_key]
+
+        key = (channel, league_id, stream)
+        future: asyncio.Future[RedisResponse] = self.loop.create_future()
+
+        if key not in self._batches:
+            self._batches[key] = []
+            self._batch_timers[key] = self.loop.call_later(BATCH_WINDOW, self._schedule_flush, key)
+
+        batch = self._batches[key]
+        batch.append((data, wait_for, future))
+
+        if len(batch) >= BATCH_MAX_SIZE:
+            self._schedule_flush(key)
+
+        response = await future
+
+        if cache_key and response.data is not None:
+            self._response_cache[cache_key] = (time.monotonic() + cache_ttl, response) # type: ignore
+            self._response_cache.move_to_end(cache_key)
+
+            # Least recently used entries go first
+            while len(self._response_cache) > RESPONSE_CACHE_MAX_SIZE:
+                self._response_cache.popitem(last=False)
+
+        return response
+
+    def _schedule_flush(self, key: Tuple[str, Optional[int], bool]) -> None:
+        # A batch flushed because it filled up must not leave its timer to flush the next one early
+        if timer := self._batch_timers.pop(key, None):
+            timer.cancel()
+
+        if entries := self._batches.pop(key, None):
+            asyncio.create_task(self._flush_batch(key, entries))
+
+    async def _flush_batch(self, key: Tuple[str, Optional[int], bool], entries: List[Tuple[Dict[str, Any], float, asyncio.Future[RedisResponse]]]) -> None:
+        channel, league_id, stream = key
+        request = RedisRequest(data={}, batch=[data for data, _, _ in entries])
+
+        try:
+            with tracer.span("ipc.batch", channel=channel, size=len(entries)):
+                await self._publish_request(channel, request, league_id, stream)
+                response = await self.wait_for_reply(request, timeout=max(wait_for for _, wait_for, _ in entries))
+        except Exception as e:
+            for _, _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        results = response.batch or []
+        for i, (_, _, future) in enumerate(entries):
+            if not future.done():
+                future.set_result(RedisResponse(data=results[i] if i < len(results) else None, origin=response.origin, error=response.error))
+
     async def wait_for_replies(self, request: RedisRequest, wait_for: float) -> List[RedisResponse]:
         self.responses[f"reply:{request.nonce}"] = []
 
@@ -185,6 +758,7 @@ class Cache:
         responses = self.responses[f"reply:{request.nonce}"]
 
         self.responses.pop(f"reply:{request.nonce}")
+        self._drop_partials(f"reply:{request.nonce}")
         await self.pubsub.unsubscribe(f"reply:{request.nonce}")
 
         return responses
@@ -196,76 +770,157 @@ class Cache:
         try:
             return await asyncio.wait_for(future, timeout=timeout)
         except asyncio.TimeoutError:
+            _ipc_timeouts.inc()
             self.futures.pop(f"reply:{request.nonce}")
             return RedisResponse(data=None)
         finally:
             future.cancel()
+            self._drop_partials(f"reply:{request.nonce}")
             await self.pubsub.unsubscribe(f"reply:{request.nonce}")
 
+    def _loads(self, item: Union[str, bytes]) -> Any:
+        if self.codec:
+            return self.codec.decode(item) # type: ignore
+        return json.loads(item)
+
+    def _dump_value(self, model: Union[Dict[str, Any], PydanticBaseModel]) -> Union[str, bytes]:
+        if self.codec:
+            return self.codec.encode(model.model_dump(mode="json") if isinstance(model, PydanticBaseModel) else model)
+        return model.model_dump_json() if isinstance(model, PydanticBaseModel) else json.dumps(model)
+
     async def set(self, *path: str | int, model: Union[Dict[str, Any], PydanticBaseModel], nx: bool=False) -> None:
-        name = ":".join([str(x) for x in path])
-        data = model.model_dump_json() if isinstance(model, PydanticBaseModel) else json.dumps(model)
+        name = self.prefix + ":".join([str(x) for x in path])
+        data = self._dump_value(model)
 
         await self.redis.set(name, data, ex=604800, nx=nx)
-        logger.debug(f"Cache set with key {name!r}")
+        logger.debug("Cache set with key %r", name)
+
+    async def set_many(self, items: Iterable[Tuple[Tuple[str | int, ...], Union[Dict[str, Any], PydanticBaseModel]]], nx: bool=False) -> None:
+        """Set many keys in a single round-trip using a non-transactional pipeline."""
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            count = 0
+            for path, model in items:
+                pipe.set(self.prefix + ":".join([str(x) for x in path]), self._dump_value(model), ex=604800, nx=nx)
+                count += 1
+
+            if not count:
+                return
+
+            await pipe.execute()
+
+        logger.debug("Cache set %d keys", count)
     
     async def get[T](self, *path: str | int, model_cls: Type[T]) -> Optional[T]:
-        name = ":".join([str(x) for x in path])
+        name = self.prefix + ":".join([str(x) for x in path])
         item = await self.redis.get(name)
 
         if not item:
-            logger.debug(f"Cache missed with key {name!r}")
+            logger.debug("Cache missed with key %r", name)
             return None
         
-        logger.debug(f"Cache hit with key {name!r}")
-        
-        data = json.loads(item)
-        if issubclass(model_cls, PydanticBaseModel):
-            return model_cls.model_validate(data)
+        try:
+            data = self._loads(item)
+        except ValueError:
+            logger.debug("Cache missed with key %r (unreadable value)", name)
+            return None
+
+        logger.debug("Cache hit with key %r", name)
+        if _validates(model_cls):
+            return _adapter(model_cls).validate_python(data)
         return model_cls(**data)
+
+    async def get_many[T](self, paths: Iterable[Tuple[str | int, ...]], model_cls: Type[T]) -> List[Optional[T]]:
+        """Get many keys with a single MGET. Results are in the same order as `paths`, with None for misses."""
+
+        names = [self.prefix + ":".join([str(x) for x in path]) for path in paths]
+        if not names:
+            return []
+
+        items = await self.redis.mget(names)
+        hits = [i for i, item in enumerate(items) if item]
+        decoded: List[Any] = []
+
+        if not self.codec:
+            try:
+                # Decode every hit with one parse instead of one json.loads per key
+                decoded = json.loads("[" + ",".join(items[i] for i in hits) + "]")
+            except ValueError:
+                decoded = []
+
+        if len(decoded) != len(hits):
+            decoded, readable = [], []
+            for i in hits:
+                try:
+                    decoded.append(self._loads(items[i]))
+                    readable.append(i)
+                except ValueError:
+                    continue
+            hits = readable
+
+        if _validates(model_cls):
+            models = _list_adapter(model_cls).validate_python(decoded)
+        else:
+            models = [model_cls(**data) for data in decoded]
+
+        results: List[Optional[T]] = [None] * len(names)
+        for i, model in zip(hits, models):
+            results[i] = model
+
+        logger.debug("Cache get for %d keys | hits: %d, misses: %d", len(names), len(hits), len(names) - len(hits))
+        return results
     
     async def delete(self, *paths: Union[Tuple[str], str]) -> None:
-        keys = [":".join(map(str, path)) if isinstance(path, (list, tuple)) else path for path in paths]
+        """Delete keys in every value format, so a process using the other format doesn't keep serving them."""
+
+        keys = [
+            key
+            for path in paths
+            for key in value_keys(":".join(map(str, path)) if isinstance(path, (list, tuple)) else path)
+        ]
         await self.redis.delete(*keys)
-        logger.debug(f"Deleted keys {keys}")
+        logger.debug("Deleted keys %s", keys)
 
+    @timed(_latency.labels(operation="hash_set"), in_flight=_in_flight.labels(operation="hash_set"))
     async def hash_set(self, model: Union[LeagueData, PlayerData, PlayerLeagueData], *, identifier: str, keys: Iterable[str]) -> None:
         necessary_keys = {'league_id', 'player_id'} if isinstance(model, PlayerLeagueData) else {'id'}
         necessary_keys.update(keys)
 
-        name = f"{model.__class__.__name__.lower()}:{identifier}"
-        dump = model.model_dump(mode="json", include=necessary_keys)
+        name = f"{self.prefix}{model.__class__.__name__.lower()}:{identifier}"
+        items = sum(len(value) for key in necessary_keys if isinstance(value := model.__dict__.get(key), (dict, list)))
+
+        # Dumping and encoding both go to the pool, so a large model is only walked once off the loop
+        mapping = await offloader.run("hash_dump", _dump_hash, self.codec, model, necessary_keys, items=items)
 
-        await self.redis.hset(name, mapping={
-            k: json.dumps(v)
-            for k, v in dump.items()
-        }) # type: ignore
+        await self.redis.hset(name, mapping=mapping) # type: ignore
         await self.redis.hexpire(name, 3600, *necessary_keys)
-        logger.debug(f"Hash cache set with key {name!r}")
+        logger.debug("Hash cache set with key %r", name)
 
+    @timed(_latency.labels(operation="hash_get"), in_flight=_in_flight.labels(operation="hash_get"))
     async def hash_get[T: Union[LeagueData, PlayerData, PlayerLeagueData]](
         self, model_cls: Type[T], *, identifier: str, keys: Iterable[str]
     ) -> Tuple[Optional[T], Set[str]]:
         necessary_keys = {'league_id', 'player_id'} if issubclass(model_cls, PlayerLeagueData) else {'id'}
         necessary_keys.update(keys)
 
-        name = f"{model_cls.__name__.lower()}:{identifier}"
+        name = f"{self.prefix}{model_cls.__name__.lower()}:{identifier}"
 
         if not await self.redis.exists(name):
-            logger.debug(f"Hash cache missed with key {name!r}")
+            _hash_miss.inc()
+            logger.debug("Hash cache missed with key %r", name)
             return (None, necessary_keys)
         
         necessary_keys = list(necessary_keys)
         data = await self.redis.hmget(name, necessary_keys) # type: ignore
 
-        mapping: Dict[str, Any] = {}
-        unretrieved: Set[str] = set()
+        size = sum(len(value) for value in data if value is not None)
+        model, unretrieved = await offloader.run("hash_load", _load_hash, self.codec, model_cls, necessary_keys, data, size=size)
 
-        for i, key in enumerate(necessary_keys):
-            if data[i] is not None:
-                mapping[key] = json.loads(data[i])
-            else:
-                unretrieved.add(key)
+        if unretrieved:
+            _hash_partial.inc()
+        else:
+            _hash_hit.inc()
 
-        logger.debug(f"Hash cache hit with key {name!r} | retrieved: {list(mapping.keys())}, missing: {unretrieved or ''}")
-        return (model_cls.model_validate(mapping), unretrieved)
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Hash cache hit with key %r | retrieved: %s, missing: %s", name, [key for key in necessary_keys if key not in unretrieved], unretrieved or '')
+        return (model, unretrieved)
\ No newline at end of file
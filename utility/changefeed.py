@@ -0,0 +1,230 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+
+import asyncpg
+
+from .cache import VALUE_FORMATS, value_keys
+from .logger import get_logger
+from .prometheus import metrics
+from .schema import Table, column_names
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = (
+    "ChangeFeed",
+)
+
+logger = get_logger()
+
+CHANGE_CHANNEL = "peerless_changes"
+BATCH_SIZE = 500
+RECONNECT_DELAY = 5.0
+
+# Only the process holding this advisory lock applies the feed, the others retry this often
+LISTENER_LOCK = f"{CHANGE_CHANNEL}:listener"
+ELECTION_INTERVAL = 5.0
+
+# Set for the transaction by writes that stored the new values in the cache themselves
+CACHED_SETTING = "peerless.cached"
+
+# Key columns of each table, used by the trigger to identify the row
+KEY_COLUMNS: Dict[Table, List[str]] = {
+    Table.LEAGUES: ["id"],
+    Table.PLAYERS: ["id"],
+    Table.PLAYER_LEAGUES: ["player_id", "league_id"],
+}
+
+def _notify_function(table: Table) -> str:
+    """A trigger function for `table` that sends its key and changed column names.
+
+    Columns are compared one at a time, so large JSONB values are never copied
+    into a whole-row document. NOTIFY payloads are limited to 8000 bytes, so
+    values aren't sent."""
+
+    keys = KEY_COLUMNS[table]
+    columns = [column for column in column_names(table) if column not in keys]
+    changes = ', '.join(f"CASE WHEN NEW.{column} IS DISTINCT FROM OLD.{column} THEN '{column}' END" for column in columns)
+
+    return f"""
+    CREATE OR REPLACE FUNCTION peerless_notify_{table.value}() RETURNS trigger AS $$
+    DECLARE
+        changed text[];
+        row_key json;
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            changed := array_remove(ARRAY[{changes}]::text[], NULL);
+
+            IF cardinality(changed) = 0 THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+
+        IF TG_OP = 'DELETE' THEN
+            row_key := json_build_array({', '.join(f"OLD.{key}" for key in keys)});
+        ELSE
+            row_key := json_build_array({', '.join(f"NEW.{key}" for key in keys)});
+        END IF;
+
+        PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'key', row_key, 'columns', changed,
+            'cached', current_setting('{CACHED_SETTING}', true)
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """
+
+_events = metrics.counter("peerless_change_feed_events", "Row changes received from PostgreSQL", ["table", "op"])
+_invalidations = metrics.counter("peerless_change_feed_invalidations", "Cache hashes invalidated by the change feed", ["kind"])
+
+_deleted = _invalidations.labels(kind="deleted")
+_fields = _invalidations.labels(kind="fields")
+
+def _hash_name(table: str, key: List[Any]) -> Optional[str]:
+    """The hash Cache.hash_set stores a row of `table` in."""
+
+    if table == Table.LEAGUES.value:
+        return f"leaguedata:{key[0]}"
+    if table == Table.PLAYERS.value:
+        return f"playerdata:{key[0]}"
+    if table == Table.PLAYER_LEAGUES.value:
+        return f"playerleaguedata:{key[0]}:{key[1]}"
+    return None
+
+async def install_triggers(con: asyncpg.Connection) -> None:
+    """Create the notify function and a trigger on every table. Safe to run from several processes at once."""
+
+    async with con.transaction():
+        # CREATE OR REPLACE isn't safe to run concurrently
+        await con.execute("SELECT pg_advisory_xact_lock(hashtext($1))", CHANGE_CHANNEL)
+
+        for table in KEY_COLUMNS:
+            await con.execute(_notify_function(table))
+            await con.execute(f"""
+                CREATE OR REPLACE TRIGGER peerless_notify_change
+                AFTER INSERT OR UPDATE OR DELETE ON {table.value}
+                FOR EACH ROW EXECUTE FUNCTION peerless_notify_{table.value}()
+            """)
+
+        # Shared by every table before the functions were generated per table
+        await con.execute("DROP FUNCTION IF EXISTS peerless_notify_change()")
+
+class ChangeFeed:
+    """Keeps the hash cache coherent with PostgreSQL, whoever writes to it.
+
+    Triggers on every table send a notification for each changed row. One
+    process, elected with an advisory lock, listens on a connection taken from
+    its pool, while the others only borrow one for each election attempt. The
+    listener applies notifications in batches: updated columns are removed from the
+    row's hash, and deleted or inserted rows drop the whole hash, so the next
+    read fetches them from the database. Writes that already stored the new
+    values in their own value format only invalidate the other format.
+    Changes made while no process is listening are missed, and those entries
+    stay until their hash TTL expires."""
+
+    def __init__(self, db: 'Database') -> None:
+        self.db = db
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Change feed failed, reconnecting", exc_info=e)
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen(self) -> None:
+        while True:
+            async with self.db.pool.acquire() as con:
+                # The pool's reset on release drops the advisory lock and the listener
+                if await con.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", LISTENER_LOCK):
+                    await self._lead(con)
+                    return
+
+            # Another process listens, the connection goes back to the pool until the next election
+            await asyncio.sleep(ELECTION_INTERVAL)
+
+    async def _lead(self, con: Any) -> None:
+        lost = asyncio.Event()
+        on_lost = lambda _: lost.set()
+        con.add_termination_listener(on_lost)
+
+        try:
+            await con.add_listener(CHANGE_CHANNEL, self._on_notify)
+            logger.info("Listening for database changes")
+
+            while not lost.is_set():
+                try:
+                    first = await asyncio.wait_for(self.queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+
+                # Everything that arrived meanwhile is handled together
+                batch = [first]
+                while len(batch) < BATCH_SIZE and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                await self.apply(batch)
+
+            logger.warning("Lost the change feed connection, changes made until it's back are not invalidated")
+        finally:
+            con.remove_termination_listener(on_lost)
+
+    def _on_notify(self, con: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            self.queue.put_nowait(json.loads(payload))
+        except ValueError:
+            logger.error(f"Ignoring unreadable change notification {payload!r}")
+
+    async def apply(self, events: List[Dict[str, Any]]) -> None:
+        deleted: Set[str] = set()
+        changed: Dict[str, Set[str]] = {}
+
+        for event in events:
+            _events.labels(table=event["table"], op=event["op"]).inc()
+
+            if not (name := _hash_name(event["table"], event["key"])):
+                continue
+
+            # Processes using the other value format keep their own copy of the row
+            for value_format, key in zip(VALUE_FORMATS, value_keys(name)):
+                if event["op"] != "UPDATE":
+                    deleted.add(key)
+                elif event.get("cached") != value_format:
+                    changed.setdefault(key, set()).update(event["columns"])
+
+        async with self.db.cache.redis.pipeline(transaction=False) as pipe:
+            if deleted:
+                pipe.delete(*deleted)
+
+            for name, columns in changed.items():
+                if name not in deleted:
+                    pipe.hdel(name, *columns)
+
+            await pipe.execute()
+
+        _deleted.inc(len(deleted))
+        _fields.inc(len(changed.keys() - deleted))
+        logger.debug("Applied %d database changes to the cache", len(events))
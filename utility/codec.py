@@ -0,0 +1,103 @@
+from enum import IntEnum
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+__all__ = (
+    "Codec",
+    "Compression",
+)
+
+class Compression(IntEnum):
+    NONE = 0
+    ZSTD = 1
+    LZ4 = 2
+
+class Codec:
+    """Binary value format for cached data.
+
+    Every value is prefixed with a two byte header: the format version and the
+    compression used for the payload. Payloads are msgpack and only compressed
+    once they reach ``threshold`` bytes, since small values don't benefit.
+    Cache stores them under their own key prefix, so processes with and
+    without a codec can share a Redis without reading each other's values."""
+
+    VERSION = 1
+
+    def __init__(self, compression: Compression=Compression.ZSTD, threshold: int=1024, level: int=3) -> None:
+        if msgpack is None:
+            raise RuntimeError("The 'msgpack' package is required to use the binary cache format")
+
+        if compression == Compression.ZSTD and zstandard is None:
+            raise RuntimeError("The 'zstandard' package is required for zstd compression")
+
+        if compression == Compression.LZ4 and lz4_frame is None:
+            raise RuntimeError("The 'lz4' package is required for lz4 compression")
+
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+        if zstandard is not None:
+            self._zstd_compressor = zstandard.ZstdCompressor(level=level)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def __reduce__(self) -> Any:
+        # Compressor objects can't be pickled, so a copy sent to a worker process builds its own
+        return (self.__class__, (self.compression, self.threshold, self.level))
+
+    def encode(self, obj: Any) -> bytes:
+        payload: bytes = msgpack.packb(obj, use_bin_type=True) # type: ignore
+        compression = Compression.NONE
+
+        if self.compression != Compression.NONE and len(payload) >= self.threshold:
+            payload = self._compress(payload)
+            compression = self.compression
+
+        return bytes((self.VERSION, compression)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """Raises ValueError for anything that isn't a readable value in this format."""
+
+        if len(data) < 2 or data[0] != self.VERSION:
+            raise ValueError(f"Unsupported cache value format (header {data[:2]!r})")
+
+        try:
+            payload = self._decompress(Compression(data[1]), memoryview(data)[2:])
+            return msgpack.unpackb(payload, raw=False) # type: ignore
+        except ValueError:
+            raise
+        except Exception as e:
+            # Corrupt frames, or a compression whose package isn't installed here
+            raise ValueError(f"Unreadable cache value: {e}") from e
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == Compression.ZSTD:
+            return self._zstd_compressor.compress(payload)
+        return lz4_frame.compress(payload, compression_level=self.level) # type: ignore
+
+    def _decompress(self, compression: Compression, payload: memoryview) -> bytes:
+        if compression == Compression.NONE:
+            return payload.tobytes()
+
+        if compression == Compression.ZSTD:
+            if zstandard is None:
+                raise RuntimeError("The 'zstandard' package is required to read zstd compressed values")
+            return self._zstd_decompressor.decompress(payload)
+
+        if lz4_frame is None:
+            raise RuntimeError("The 'lz4' package is required to read lz4 compressed values")
+        return lz4_frame.decompress(payload)
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Optional, Set, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Type, Union
 
 import asyncpg
 from discord.utils import MISSING
@@ -11,11 +11,16 @@ from tenacity import (
 )
 
 from .cache import Cache
+from .changefeed import CACHED_SETTING, ChangeFeed, install_triggers
 from .env import get_env
 from .logger import get_logger
 from .models import LeagueData, PlayerData, PlayerLeagueData
+from .offload import offloader
+from .prometheus import metrics, timed
 from .query_builder import Query
-from .schema import Table, create_missing_tables
+from .scheduler import Scheduler
+from .schema import Table, create_missing_tables, jsonb_columns
+from .tracing import traced
 
 __all__ = (
     'Database',
@@ -23,6 +28,12 @@ __all__ = (
 
 logger = get_logger()
 
+_latency = metrics.histogram("peerless_database_operation_seconds", "Latency of database operations", ["operation"])
+_in_flight = metrics.gauge("peerless_database_in_flight", "Database operations currently running", ["operation"])
+_queries = metrics.counter("peerless_database_queries", "Queries sent to PostgreSQL", ["table"])
+
+_table_queries = {table: _queries.labels(table=table.value) for table in Table}
+
 def _dumps(obj: Any):
     return json.dumps(obj)
 
@@ -31,6 +42,13 @@ def _loads(obj: Any):
         return dict()
     return json.loads(obj)
 
+def _validate[T: Union[LeagueData, PlayerData, PlayerLeagueData]](model_cls: Type[T], data: Dict[str, Any], text_keys: Set[str]) -> T:
+    for key in text_keys:
+        if data.get(key) is not None:
+            data[key] = _loads(data[key])
+
+    return model_cls.model_validate(data)
+
 async def postgres_initializer(con):
     """Set up custom JSONB codec for asyncpg connections."""
 
@@ -43,11 +61,22 @@ async def postgres_initializer(con):
     )
 
 class Database:
-    """Database class for handling PostgreSQL and cache operations."""
+    """Database class for handling PostgreSQL and cache operations.
+
+    Every instance keeps the expiry schedule in sync with its writes, but only
+    ones created with `background=True`, i.e. the bot workers, process it and
+    run the change feed. The feed holds one of the pool's connections."""
 
-    def __init__(self, cache: Cache) -> None:
+    def __init__(self, cache: Cache, pool_size: Optional[int]=None, *, background: bool=False) -> None:
         self.cache = cache
+        self.background = background
         self.pool: asyncpg.Pool
+        self.scheduler: Scheduler
+        self.changes: Optional[ChangeFeed] = None
+
+        # Processes started by the supervisor get their share of the global connection budget
+        env_pool_size = get_env("DB_POOL_SIZE", "")
+        self.pool_size = pool_size or (int(env_pool_size) if env_pool_size else 10)
 
     async def connect(self) -> None:
         """Connect to the PostgreSQL database and ensure required tables exist."""
@@ -68,6 +97,18 @@ class Database:
             # Blocking but quick operation to create missing tables
             create_missing_tables(missing_tables)
 
+        self.scheduler = Scheduler(self)
+        if self.background:
+            self.scheduler.start()
+
+        # Invalidate cached rows on every write, including ones that bypass this class
+        if self.background and get_env("CHANGE_FEED", "") != "0":
+            async with self.pool.acquire() as con:
+                await install_triggers(con)
+
+            self.changes = ChangeFeed(self)
+            self.changes.start()
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=1, max=10),
@@ -76,33 +117,70 @@ class Database:
     async def _handle_connect(self) -> None:
         """Create asyncpg connection pool with retry logic."""
 
-        self.pool = await asyncpg.create_pool(dsn=get_env("DATABASE_URL"), init=postgres_initializer)
+        self.pool = await asyncpg.create_pool(
+            dsn=get_env("DATABASE_URL"),
+            init=postgres_initializer,
+            min_size=min(self.pool_size, 10),
+            max_size=self.pool_size,
+            # Naive timestamps inside JSONB are compared as UTC by the scheduler
+            server_settings={"timezone": "UTC"},
+        )
         logger.info("Connected to PostgreSQL")
 
     async def close(self) -> None:
         """Close the database connection pool."""
 
+        if hasattr(self, 'scheduler'):
+            await self.scheduler.stop()
+
+        if self.changes:
+            await self.changes.stop()
+
         if hasattr(self, 'pool'):
             await self.pool.close()
 
         logger.info("Closed PostgreSQL connection")
 
-    async def insert(self, table: Table, model: Union[LeagueData, PlayerData, PlayerLeagueData], excluded: Set[str]) -> None:
-        """Insert a model into a database table."""
+    @staticmethod
+    def _columns(table: Table, keys: Iterable[str]) -> List[str]:
+        """Columns to select for `keys`, JSONB ones as text so `_validate` can parse them in the offload pool."""
+
+        jsonb = jsonb_columns(table)
+        return [f"{key}::text AS {key}" if key in jsonb else key for key in keys]
+
+    async def _validate[T: Union[LeagueData, PlayerData, PlayerLeagueData]](
+        self, model_cls: Type[T], table: Table, row: asyncpg.Record, cached: Optional[Dict[str, Any]]=None
+    ) -> T:
+        """Parse and validate a row selected with `_columns`, in the offload pool if its JSONB is large."""
+
+        cached = cached or {}
+        text_keys = (jsonb_columns(table) & set(row.keys())) - set(cached)
+        size = sum(len(row[key]) for key in text_keys if row[key] is not None)
+
+        return await offloader.run("validate", _validate, model_cls, dict(row) | cached, text_keys, size=size)
+
+    @traced("db.insert")
+    async def insert(self, table: Table, model: Union[LeagueData, PlayerData, PlayerLeagueData], excluded: Set[str]) -> bool:
+        """Insert a model into a database table. Returns whether the row was inserted."""
 
         dump = model.model_dump(mode='json', exclude=excluded)
         query, args = Query.insert(table=table.value, values=dump)
 
         try:
+            _table_queries[table].inc()
             await self.pool.execute(query, *args)
-            logger.debug(f"Inserted ID {model.id} into table {table.value!r}")
+            logger.debug("Inserted ID %s into table %r", model.id, table.value)
+            return True
         except asyncpg.UniqueViolationError:
             logger.error(f"{model.__class__.__name__} with ID {model.id} already exists in table {table.value!r}")
         except asyncpg.PostgresError as e:
             logger.error(f"Database error while trying to insert into table {table.value!r} with ID {model.id}", exc_info=e)
 
-    async def update(self, table: Table, model: Union[LeagueData, PlayerData, PlayerLeagueData], *, keys: Set[str]) -> None:
-        """Update data in a database table."""
+        return False
+
+    @traced("db.update")
+    async def update(self, table: Table, model: Union[LeagueData, PlayerData, PlayerLeagueData], *, keys: Set[str], cached: bool=False) -> None:
+        """Update data in a database table. Pass `cached` when the caller writes the new values to the cache itself."""
 
         dump = model.model_dump(mode='json', include=set(keys))
 
@@ -111,14 +189,18 @@ class Database:
         else:
             where = {"id": model.id}
 
-        query, args = Query.update(table=table.value, values=dump, where=where)
+        # Tells the change feed not to invalidate what this process is about to cache
+        settings = {CACHED_SETTING: self.cache.value_format} if cached else None
+        query, args = Query.update(table=table.value, values=dump, where=where, settings=settings)
 
         try:
+            _table_queries[table].inc()
             await self.pool.execute(query, *args)
-            logger.debug(f"Updated ID {model.id} with keys {keys} in table {table.value!r}")
+            logger.debug("Updated ID %s with keys %s in table %r", model.id, keys, table.value)
         except asyncpg.PostgresError as e:
             logger.error(f"Database error while trying to update table {table.value!r} with ID {model.id}", exc_info=e)
 
+    @traced("db.delete")
     async def delete(self, table: Table, model: Union[LeagueData, PlayerData, PlayerLeagueData]) -> None:
         """Delete data from a database table."""
 
@@ -130,8 +212,9 @@ class Database:
         query, args = Query.delete(table=table.value, where=where)
 
         try:
+            _table_queries[table].inc()
             await self.pool.execute(query, *args)
-            logger.debug(f"Deleted ID {model.id} from table {table.value!r}")
+            logger.debug("Deleted ID %s from table %r", model.id, table.value)
         except asyncpg.PostgresError as e:
             logger.error(f"Database error while trying to delete table {table.value!r} with ID {model.id}", exc_info=e)
 
@@ -169,26 +252,32 @@ class Database:
         player_league_data = PlayerLeagueData(player_id=player_data.id, league_id=league_data.id).bind(self)
         player_league_data.__pydantic_fields_set__.update(keys)
 
-        await self.insert(
+        inserted = await self.insert(
             table = Table.PLAYER_LEAGUES,
             model = player_league_data,
             excluded = set()
         )
 
+        if inserted:
+            await self.scheduler.sync(player_league_data, keys={"demands", "suspension"})
+
         return player_league_data
     
     async def update_league(self, league_data: LeagueData, *, keys: Set[str]) -> None:
         """Update LeagueData in the database and cache."""
 
-        await self.update(Table.LEAGUES, league_data, keys=keys)
+        await self.update(Table.LEAGUES, league_data, keys=keys, cached=True)
         await self.cache.hash_set(league_data, identifier=str(league_data.id), keys=keys)
 
     async def update_player_league(self, player_league_data: PlayerLeagueData, *, keys: Set[str]) -> None:
         """Update PlayerLeagueData in the database and cache."""
 
-        await self.update(Table.PLAYER_LEAGUES, player_league_data, keys=keys)
+        await self.update(Table.PLAYER_LEAGUES, player_league_data, keys=keys, cached=True)
         await self.cache.hash_set(player_league_data, identifier=f"{player_league_data.player_id}:{player_league_data.league_id}", keys=keys)
+        await self.scheduler.sync(player_league_data, keys=keys)
 
+    @traced("db.fetch_league")
+    @timed(_latency.labels(operation="fetch_league"), in_flight=_in_flight.labels(operation="fetch_league"))
     async def fetch_league(self, league_id: int, *, keys: Set[str]) -> Optional[LeagueData]:
         """Fetch LeagueData from the cache with fallback to the database."""
 
@@ -200,28 +289,30 @@ class Database:
         try:
             if league_data and missing:
                 # Fetch missing fields from database
-                query, args = Query.select(table=Table.LEAGUES.value, columns=missing, where={"id": league_id})
+                query, args = Query.select(table=Table.LEAGUES.value, columns=self._columns(Table.LEAGUES, missing), where={"id": league_id})
+                _table_queries[Table.LEAGUES].inc()
                 data = await self.pool.fetchrow(query, *args)
 
                 if not data:
-                    logger.debug(f"No data found for ID '{league_id}' in {Table.LEAGUES.value!r} database")
+                    logger.debug("No data found for ID '%s' in %r database", league_id, Table.LEAGUES.value)
                     return None
                 
-                league_data = league_data.model_validate(dict(data) | league_data.model_dump(include=necessary_keys))
-                logger.debug(f"Fetched missing keys for ID '{league_id}' from {Table.LEAGUES.value!r} database")
+                league_data = await self._validate(LeagueData, Table.LEAGUES, data, league_data.model_dump(include=necessary_keys))
+                logger.debug("Fetched missing keys for ID '%s' from %r database", league_id, Table.LEAGUES.value)
                 await self.cache.hash_set(league_data, identifier=str(league_id), keys=necessary_keys)
 
             elif not league_data:
                 # Fetch all necessary fields from database
-                query, args = Query.select(table=Table.LEAGUES.value, columns=necessary_keys, where={"id": league_id})
+                query, args = Query.select(table=Table.LEAGUES.value, columns=self._columns(Table.LEAGUES, necessary_keys), where={"id": league_id})
+                _table_queries[Table.LEAGUES].inc()
                 data = await self.pool.fetchrow(query, *args)
 
                 if not data:
-                    logger.debug(f"No data found for ID '{league_id}' in {Table.LEAGUES.value!r} database")
+                    logger.debug("No data found for ID '%s' in %r database", league_id, Table.LEAGUES.value)
                     return None
                 
-                league_data = LeagueData.model_validate(dict(data))
-                logger.debug(f"Fetched data for ID '{league_id}' from {Table.LEAGUES.value!r} database")
+                league_data = await self._validate(LeagueData, Table.LEAGUES, data)
+                logger.debug("Fetched data for ID '%s' from %r database", league_id, Table.LEAGUES.value)
                 await self.cache.hash_set(league_data, identifier=str(league_id), keys=missing or set())
         except asyncpg.PostgresError as e:
             logger.error(f"Database error while trying to select from table {Table.LEAGUES.value!r} with ID {league_id}")
@@ -229,6 +320,8 @@ class Database:
         
         return league_data.bind(self)
 
+    @traced("db.fetch_player")
+    @timed(_latency.labels(operation="fetch_player"), in_flight=_in_flight.labels(operation="fetch_player"))
     async def fetch_player(self, player_id: int, league_id: Optional[int], *, keys: Set[str]) -> Optional[PlayerData]:
         """Fetch PlayerData (and optionally PlayerLeagueData) from the cache with fallback to the database."""
 
@@ -247,33 +340,36 @@ class Database:
             try:
                 if not player_data:
                     # Fetch PlayerData from database
+                    _table_queries[Table.PLAYERS].inc()
                     data = await self.pool.fetchrow(f"SELECT id FROM {Table.PLAYERS.value} WHERE id=$1", player_id)
 
                     if not data:
-                        logger.debug(f"No data found for ID {player_id} in {Table.PLAYERS.value!r} database")
+                        logger.debug("No data found for ID %s in %r database", player_id, Table.PLAYERS.value)
                         return None
                     
                     player_data = PlayerData.model_validate(dict(data) | {"leagues": {}})
-                    logger.debug(f"Fetched data for ID '{player_id}' from {Table.PLAYERS.value!r} database")
+                    logger.debug("Fetched data for ID '%s' from %r database", player_id, Table.PLAYERS.value)
                     await self.cache.hash_set(player_data, identifier=str(player_id), keys={'id'})
 
                 if missing != MISSING and not player_league_data:
                     # Fetch PlayerLeagueData from database
-                    data = await self.pool.fetchrow(f"SELECT {', '.join(necessary_keys)} FROM {Table.PLAYER_LEAGUES.value} WHERE player_id=$1 AND league_id=$2", player_id, league_id)
+                    _table_queries[Table.PLAYER_LEAGUES].inc()
+                    data = await self.pool.fetchrow(f"SELECT {', '.join(self._columns(Table.PLAYER_LEAGUES, necessary_keys))} FROM {Table.PLAYER_LEAGUES.value} WHERE player_id=$1 AND league_id=$2", player_id, league_id)
 
                     if data:
-                        player_league_data = PlayerLeagueData.model_validate(dict(data))
-                        logger.debug(f"Fetched data for ID '{player_id}:{league_id}' from {Table.PLAYER_LEAGUES.value!r} database")
+                        player_league_data = await self._validate(PlayerLeagueData, Table.PLAYER_LEAGUES, data)
+                        logger.debug("Fetched data for ID '%s:%s' from %r database", player_id, league_id, Table.PLAYER_LEAGUES.value)
                         await self.cache.hash_set(player_league_data, identifier=f"{player_id}:{league_id}", keys=necessary_keys)
 
                 # If some keys are missing, fetch them
                 elif missing != MISSING and player_league_data and missing:
-                    data = await self.pool.fetchrow(f"SELECT {', '.join(missing)} FROM {Table.PLAYER_LEAGUES.value} WHERE player_id=$1 AND league_id=$2", player_id, league_id)
+                    _table_queries[Table.PLAYER_LEAGUES].inc()
+                    data = await self.pool.fetchrow(f"SELECT {', '.join(self._columns(Table.PLAYER_LEAGUES, missing))} FROM {Table.PLAYER_LEAGUES.value} WHERE player_id=$1 AND league_id=$2", player_id, league_id)
 
                     if data:
-                        player_league_data = player_league_data.model_validate(dict(data) | player_league_data.model_dump(include=necessary_keys))
+                        player_league_data = await self._validate(PlayerLeagueData, Table.PLAYER_LEAGUES, data, player_league_data.model_dump(include=necessary_keys))
 
-                        logger.debug(f"Fetched missing keys for ID '{player_id}:{league_id}' from {Table.PLAYER_LEAGUES.value!r} database")
+                        logger.debug("Fetched missing keys for ID '%s:%s' from %r database", player_id, league_id, Table.PLAYER_LEAGUES.value)
                         await self.cache.hash_set(player_league_data, identifier=f"{player_id}:{league_id}", keys=missing)
                     else:
                         # No data found for missing keys (Should not happen)
@@ -0,0 +1,267 @@
+import ast
+import builtins
+import functools
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import sysconfig
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .env import get_env
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel as PydanticBaseModel
+
+    from .cache import Cache
+    from .ipcmodels import RedisCommand
+
+__all__ = (
+    "Endpoint",
+    "discover_endpoints",
+)
+
+logger = get_logger()
+
+# Bumped when scanning changes, so manifests written by an older scanner are discarded
+MANIFEST_VERSION = 3
+
+type Commands = List[Tuple[str, str, bool]]
+
+class Endpoint:
+    """A RedisCommand found on disk. Its module is imported the first time a message arrives for it."""
+
+    __slots__ = ("module", "name", "CHANNEL", "STREAM", "_command")
+
+    def __init__(self, module: str, name: str, channel: str, stream: bool=False) -> None:
+        self.module = module
+        self.name = name
+        self.CHANNEL = channel
+        self.STREAM = stream
+
+        self._command: Optional['RedisCommand[PydanticBaseModel]'] = None
+
+    def load(self, cache: 'Cache') -> 'RedisCommand[PydanticBaseModel]':
+        if self._command is None:
+            logger.info(f"Loading command {self.name!r} on channel {self.CHANNEL!r}")
+            command_cls = getattr(importlib.import_module(self.module), self.name)
+            self._command = command_cls(cache)
+
+        return self._command # type: ignore
+
+_UNKNOWN = object()
+
+def _literal(node: ast.AST) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return _UNKNOWN
+
+@functools.cache
+def _is_external(module: str) -> bool:
+    """Whether a top-level module comes from the standard library or an installed package,
+    neither of which can define a subclass of RedisCommand. Finding it doesn't run it."""
+
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return False
+
+    if spec is None:
+        return False
+    if spec.origin in ("built-in", "frozen"):
+        return True
+
+    location = spec.origin or next(iter(spec.submodule_search_locations or []), None)
+    if not location:
+        return False
+
+    paths = sysconfig.get_paths()
+    roots = {os.path.realpath(paths[name]) for name in ("stdlib", "platstdlib", "purelib", "platlib")}
+    return any(os.path.realpath(location).startswith(root + os.sep) for root in roots)
+
+def _imports(tree: ast.Module) -> Dict[str, str]:
+    """Names bound by the module's top-level imports, mapped to the module they come from."""
+
+    names: Dict[str, str] = {}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                names[alias.asname or alias.name] = "." * node.level + (node.module or "")
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                names[alias.asname or alias.name.split(".")[0]] = alias.name
+
+    return names
+
+def _scan_source(source: str) -> Optional[Commands]:
+    """Find RedisCommand subclasses without executing the module.
+
+    Returns None whenever the source alone can't tell, in which case the module has
+    to be imported: a base class imported from the project, or a CHANNEL or STREAM
+    that isn't a literal. Bases from the standard library or installed packages are
+    never commands, and attributes are inherited from parents in the same file."""
+
+    tree = ast.parse(source)
+    imports = _imports(tree)
+
+    commands: Commands = []
+
+    # Classes defined so far, with their attributes if they are commands
+    classes: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        inherited: Optional[Dict[str, Any]] = None
+
+        for base in reversed(node.bases):
+            parts = ast.unparse(base.value if isinstance(base, ast.Subscript) else base).split(".")
+
+            if parts[-1] == "RedisCommand":
+                parent: Optional[Dict[str, Any]] = {}
+            elif len(parts) == 1 and parts[0] in classes:
+                parent = classes[parts[0]]
+            elif len(parts) == 1 and parts[0] not in imports and hasattr(builtins, parts[0]):
+                parent = None
+            elif (module := imports.get(parts[0])) and not module.startswith(".") and _is_external(module.split(".")[0]):
+                parent = None
+            else:
+                return None
+
+            if parent is not None:
+                inherited = (inherited or {}) | parent
+
+        if inherited is None:
+            classes[node.name] = None
+            continue
+
+        attributes = dict(inherited)
+        for statement in node.body:
+            if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name):
+                attributes[statement.targets[0].id] = _literal(statement.value)
+            elif isinstance(statement, ast.AnnAssign) and isinstance(statement.target, ast.Name) and statement.value:
+                attributes[statement.target.id] = _literal(statement.value)
+
+        classes[node.name] = attributes
+
+        if "CHANNEL" not in attributes:
+            continue # Abstract base for other commands
+
+        channel, stream = attributes["CHANNEL"], attributes.get("STREAM", False)
+        if not isinstance(channel, str) or not isinstance(stream, bool):
+            return None
+
+        commands.append((node.name, channel, stream))
+
+    return commands
+
+def _digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+def _import_commands(module_path: str) -> Tuple[Commands, Dict[str, Optional[str]]]:
+    """Import the module to find its commands. Also returns the digests of the project
+    files their base classes come from, since a change there can change the result."""
+
+    from .ipcmodels import RedisCommand
+
+    module = importlib.import_module(module_path)
+    commands: Commands = []
+    dependencies: Dict[str, Optional[str]] = {}
+
+    for obj in module.__dict__.values():
+        if not (isinstance(obj, type) and issubclass(obj, RedisCommand) and obj.__module__ == module.__name__ and hasattr(obj, "CHANNEL")):
+            continue
+
+        commands.append((obj.__name__, obj.CHANNEL, obj.STREAM))
+
+        for base in obj.__mro__[1:]:
+            path = getattr(sys.modules.get(base.__module__), "__file__", None)
+            if path and base.__module__ != module.__name__ and not _is_external(base.__module__.split(".")[0]):
+                dependencies[os.path.realpath(path)] = _digest(path)
+
+    return commands, dependencies
+
+def _manifest_path(folder_path: str) -> str:
+    """Where the manifest for `folder_path` is kept, outside the source tree so read-only images work."""
+
+    root = get_env("ENDPOINT_CACHE_DIR", "") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "peerless"
+    )
+    folder = hashlib.sha256(os.path.realpath(folder_path).encode()).hexdigest()[:16]
+    return os.path.join(root, f"endpoints-{folder}.json")
+
+def _write_manifest(path: str, contents: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Workers starting together each write a complete file, the last rename wins
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(contents, file)
+        os.replace(temporary, path)
+    except OSError as e:
+        logger.debug(f"Couldn't write the endpoint manifest {path!r}: {e}")
+
+def discover_endpoints(folder_path: str) -> List[Endpoint]:
+    """Find every RedisCommand under `folder_path` by reading the source.
+
+    Results are cached per file in a manifest under ENDPOINT_CACHE_DIR, by default
+    ~/.cache/peerless, and reused while the file's contents are unchanged. Files
+    that had to be imported are also rescanned when a project module their
+    commands inherit from changes."""
+
+    manifest_path = _manifest_path(folder_path)
+    try:
+        with open(manifest_path) as file:
+            contents: Dict[str, Any] = json.load(file)
+    except (OSError, ValueError):
+        contents = {}
+
+    manifest: Dict[str, Any] = contents.get("files", {}) if contents.get("version") == MANIFEST_VERSION else {}
+
+    updated: Dict[str, Any] = {}
+    endpoints: List[Endpoint] = []
+
+    for dirpath, _, files in os.walk(folder_path):
+        for file in files:
+            if not file.endswith('.py'):
+                continue
+
+            path = os.path.join(dirpath, file)
+            module_path = path.replace(os.sep, '.').replace('/', '.')[:-3]
+
+            with open(path, "rb") as source_file:
+                source = source_file.read()
+            digest = hashlib.sha256(source).hexdigest()
+
+            entry = manifest.get(path)
+            if (
+                not entry
+                or entry["digest"] != digest
+                or any(_digest(dependency) != expected for dependency, expected in entry["dependencies"].items())
+            ):
+                commands = _scan_source(source.decode())
+                dependencies: Dict[str, Optional[str]] = {}
+
+                if commands is None:
+                    commands, dependencies = _import_commands(module_path)
+
+                entry = {"digest": digest, "dependencies": dependencies, "commands": commands}
+
+            updated[path] = entry
+            endpoints.extend(Endpoint(module_path, name, channel, stream) for name, channel, stream in entry["commands"])
+
+    if updated != manifest:
+        _write_manifest(manifest_path, {"version": MANIFEST_VERSION, "files": updated})
+
+    return endpoints
@@ -1,6 +1,6 @@
 import json
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Union
 from uuid import uuid4
 
 from pydantic import BaseModel as PydanticBaseModel
@@ -15,6 +15,7 @@ __all__ = (
     "RedisRequest",
     "RedisResponse",
     "RedisCommand",
+    "TraceContext",
 )
 
 class ReturnWhen(Enum):
@@ -32,24 +33,49 @@ class RedisMessage(PydanticBaseModel):
 
     @field_validator('data', mode='before')
     @classmethod
-    def wrap_data(cls, data: int | str, handler: Any):
-        if isinstance(data, str):
+    def wrap_data(cls, data: int | str | bytes, handler: Any):
+        if isinstance(data, (str, bytes)):
             return json.loads(data)
         return data
 
+class TraceContext(PydanticBaseModel):
+    trace_id: str
+    span_id: str
+    sent_at: int # Unix time in nanoseconds when the envelope was published
+
 class RedisRequest(PydanticBaseModel):
     nonce: str = Field(default_factory=lambda : str(uuid4()))
     data: Dict[str, Any]
+    trace: Optional[TraceContext] = None
+
+    # Several requests for the same channel sent in one envelope, `data` is unused
+    batch: Optional[List[Dict[str, Any]]] = None
 
 class RedisResponse(PydanticBaseModel):
     data: Optional[Dict[str, Any]]
+    trace: Optional[TraceContext] = None
+    batch: Optional[List[Optional[Dict[str, Any]]]] = None
+
+    # Streamed replies are sent as numbered chunks followed by a final message
+    seq: int = 0
+    final: bool = True
+    origin: Optional[str] = None
+
+    # Set when the responder couldn't handle the request at all, e.g. its command failed to load
+    error: Optional[str] = None
 
 class RedisCommand[T: PydanticBaseModel]:
     CHANNEL: str
     MODEL: T
 
+    # Receive requests through a Redis Stream consumer group instead of pub/sub,
+    # so each request is handled by exactly one process and survives reconnects.
+    # Senders have to pass stream=True for these commands.
+    STREAM: bool = False
+
     def __init__(self, cache: 'Cache') -> None:
         self.cache = cache
 
-    async def handle(self, context: T) -> Optional[Dict[str, Any]]:
+    async def handle(self, context: T) -> Optional[Dict[str, Any]] | AsyncIterator[Dict[str, Any]]:
+        """Handle a request. Implement as an async generator to stream the reply in chunks."""
         raise NotImplementedError()
\ No newline at end of file
@@ -1,36 +1,85 @@
 # utils/logger.py
+import atexit
+import datetime
+import json
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 
 import colorlog
 
 __all__ = (
     "get_logger",
+    "JsonFormatter",
 )
 
-def get_logger(name: str = "peerless", level: int = logging.INFO) -> logging.Logger:
-    """Create and return a colorized logger instance."""
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line for log aggregation."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(payload, default=str)
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+def get_logger(name: str = "peerless", level: int = logging.INFO, *, use_queue: Optional[bool] = None, json_format: Optional[bool] = None) -> logging.Logger:
+    """Create and return a colorized logger instance.
+
+    With `use_queue` (or LOG_QUEUE=1) records are handed to a QueueListener thread,
+    so writing to the stream never blocks the event loop. With `json_format`
+    (or LOG_FORMAT=json) records are written as JSON lines instead of colored text."""
     logger = logging.getLogger(name)
 
     if logger.handlers:
         return logger # Prevent duplicate handlers
 
+    if use_queue is None:
+        use_queue = _env_flag("LOG_QUEUE")
+
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "").lower() == "json"
+
     logger.setLevel(level)
 
     handler = logging.StreamHandler()
     handler.setLevel(level)
 
-    formatter = colorlog.ColoredFormatter(
-        fmt="%(log_color)s[%(asctime)s][%(levelname)s] %(message)s",
-        datefmt='%m/%d/%Y %I:%M:%S %p',
-        log_colors={
-            "DEBUG": "white",
-            "INFO": "green",
-            "WARNING": "yellow",
-            "ERROR": "red",
-            "CRITICAL": "bold_red",
-        },
-    )
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = colorlog.ColoredFormatter(
+            fmt="%(log_color)s[%(asctime)s][%(levelname)s] %(message)s",
+            datefmt='%m/%d/%Y %I:%M:%S %p',
+            log_colors={
+                "DEBUG": "white",
+                "INFO": "green",
+                "WARNING": "yellow",
+                "ERROR": "red",
+                "CRITICAL": "bold_red",
+            },
+        )
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
-    return logger
\ No newline at end of file
+    if use_queue:
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+        logger.addHandler(QueueHandler(log_queue))
+    else:
+        logger.addHandler(handler)
+
+    return logger
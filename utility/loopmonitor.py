@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Coroutine, Optional
+
+from .env import get_env
+from .logger import get_logger
+from .prometheus import metrics
+
+__all__ = (
+    "LoopLagMonitor",
+    "run",
+)
+
+logger = get_logger()
+
+_lag = metrics.histogram(
+    "peerless_event_loop_lag_seconds", "Delay between when the loop lag sampler should have woken up and when it did",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+).labels()
+_stalls = metrics.counter("peerless_event_loop_stalls", "Times the event loop was blocked for longer than the threshold").labels()
+
+def run[R](main: Coroutine[Any, Any, R], *, use_uvloop: Optional[bool]=None) -> R:
+    """Run `main` like asyncio.run, on uvloop when enabled (USE_UVLOOP=1) and installed."""
+
+    if use_uvloop is None:
+        use_uvloop = get_env("USE_UVLOOP", "").lower() in ("1", "true", "yes")
+
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("USE_UVLOOP is set but uvloop is not installed, using the default event loop")
+        else:
+            return uvloop.run(main)
+
+    return asyncio.run(main)
+
+class LoopLagMonitor:
+    """Detects synchronous work blocking the event loop.
+
+    A task on the loop records how late it wakes up. A watchdog thread checks
+    that the task keeps running, and when the loop has been stuck for longer
+    than `threshold` it logs the stack the loop thread is executing, which is
+    the code doing the blocking."""
+
+    def __init__(self, threshold: float=0.25, interval: float=0.1) -> None:
+        self.threshold = threshold
+        self.interval = interval
+
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> Optional['LoopLagMonitor']:
+        """A monitor using LOOP_LAG_THRESHOLD (default 0.25s), or None if it is set to 0."""
+
+        threshold = float(get_env("LOOP_LAG_THRESHOLD", "") or 0.25)
+        return cls(threshold=threshold) if threshold > 0 else None
+
+    def start(self) -> None:
+        if self._task:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+
+            now = time.monotonic()
+            _lag.observe(max(0.0, now - expected))
+            self._last_tick = now
+
+    def _watch(self) -> None:
+        stalled_since: Optional[float] = None
+
+        while not self._stopped.wait(self.interval / 2):
+            blocked = time.monotonic() - self._last_tick - self.interval
+
+            if blocked > self.threshold and stalled_since is None:
+                stalled_since = self._last_tick
+                _stalls.inc()
+
+                frame = sys._current_frames().get(self._loop_thread_id) # type: ignore
+                stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+                logger.warning(f"Event loop blocked for over {self.threshold:.2f}s, currently running:\n{stack}")
+
+            elif blocked <= self.threshold and stalled_since is not None:
+                logger.warning(f"Event loop was blocked for {self._last_tick - stalled_since - self.interval:.2f}s")
+                stalled_since = None
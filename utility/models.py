@@ -1,3 +1,4 @@
+import dataclasses
 import datetime
 from typing import (
     TYPE_CHECKING,
@@ -9,20 +10,13 @@ from typing import (
     Optional,
     Self,
     Tuple,
-    Type,
     TypedDict,
 )
 from uuid import uuid4
 
-from discord.utils import MISSING
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import (
-    ConfigDict,
-    Field,
-    ModelWrapValidatorHandler,
-    PrivateAttr,
-    model_validator,
-)
+from pydantic import ConfigDict, Field, PrivateAttr
+from pydantic.dataclasses import dataclass
 
 from .namespace import Namespace
 
@@ -40,28 +34,22 @@ __all__ = (
     'DemandData',
     'SuspensionData',
     'ContractData',
-    'SettingType'
+    'SettingType',
+    'DEFAULT_DEMANDS',
 )
 
+# Demands a player starts with and gets back once they expire. Leagues can't configure it yet,
+# so everything that refills demands uses this
+DEFAULT_DEMANDS = 3
+
 type SettingType = Literal['alert', 'channel', 'day', 'number', 'option', 'ping', 'role', 'status', 'theme', 'timezone']
 
 class DataModel(PydanticBaseModel, Mapping):
-    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+    # Assigned fields are validated too, so dicts set on teams or settings become value objects before a dump
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, validate_assignment=True)
 
     _db: 'Database' = PrivateAttr(init=False)
 
-    @model_validator(mode='wrap')
-    @classmethod
-    def model_validator(cls: Type[Self], data: Dict[str, Any], handler: ModelWrapValidatorHandler[Self]) -> Self:
-        for key, field in cls.model_fields.items():
-            if (val := data.get(key, MISSING)) is MISSING:
-                continue
-
-            if field.annotation and isinstance(val, dict) and Namespace in field.annotation.mro():
-                data[key] = Namespace(val)
-
-        return handler(data)
-
     def __getattribute__(self, key: str) -> Any:
         if (
             key in super().__getattribute__('__pydantic_fields__').keys()
@@ -109,12 +97,19 @@ class DataModel(PydanticBaseModel, Mapping):
         self._db = db
         return self
 
+    def __getstate__(self) -> Dict[Any, Any]:
+        # The database handle can't leave the process, copies have to be bound again
+        state = super().__getstate__()
+        state['__pydantic_private__'] = {}
+        return state
+
 class LeagueData(DataModel):
     id: int
     teams: Namespace[str, 'TeamData'] = Field(default_factory=Namespace)
     settings: Namespace[str, 'SettingData[Any]'] = Field(default_factory=Namespace)
 
-class SettingData[V: Any](PydanticBaseModel):
+@dataclass(slots=True, kw_only=True)
+class SettingData[V: Any]:
     value: V
     type: SettingType
 
@@ -126,8 +121,9 @@ class GlobalPing(TypedDict):
     key: Literal["everyone", "here"]
     value: None
 
-class TeamData(PydanticBaseModel):
-    token: str = Field(default_factory=lambda : str(uuid4()))
+@dataclass(slots=True, kw_only=True)
+class TeamData:
+    token: str = dataclasses.field(default_factory=lambda : str(uuid4()))
 
     role_name: str
     role_id: Optional[int] = None
@@ -144,7 +140,7 @@ class PlayerLeagueData(DataModel):
     player_id: int
     league_id: int
 
-    demands: 'DemandData' = Field(default_factory=lambda: DemandData(remaining=3, available_at=datetime.datetime.now()))
+    demands: 'DemandData' = Field(default_factory=lambda: DemandData(remaining=DEFAULT_DEMANDS, available_at=datetime.datetime.now(datetime.UTC)))
     suspension: Optional['SuspensionData'] = None
     contract: Optional['ContractData'] = None
 
@@ -156,17 +152,20 @@ class PlayerLeagueData(DataModel):
     def id(self) -> Tuple[int, int]:
         return (self.player_id, self.league_id)
 
-class DemandData(PydanticBaseModel):
+@dataclass(slots=True, kw_only=True)
+class DemandData:
     remaining: int
     available_at: datetime.datetime
 
-class SuspensionData(PydanticBaseModel):
+@dataclass(slots=True, kw_only=True)
+class SuspensionData:
     reason: Optional[str]
     until: datetime.datetime
     banned: bool
     proof: Optional[List[str]]
 
-class ContractData(PydanticBaseModel):
+@dataclass(slots=True, kw_only=True)
+class ContractData:
     team_token: str
     notes: str
     salary: Optional[float]
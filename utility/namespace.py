@@ -1,4 +1,8 @@
-from typing import Any, Mapping, overload
+from typing import TYPE_CHECKING, Any, Dict, Mapping, get_args, overload
+
+if TYPE_CHECKING:
+    from pydantic import GetCoreSchemaHandler
+    from pydantic_core import CoreSchema
 
 __all__ = (
     'Namespace',
@@ -53,6 +57,15 @@ class Namespace[K, V](dict[K, V]):
         except KeyError:
             raise AttributeError(f"'Namespace' object has no attribute '{key}'")
         
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: 'GetCoreSchemaHandler') -> 'CoreSchema':
+        # Imported here so `import utility` doesn't load pydantic just for this module
+        from pydantic_core import core_schema
+
+        # Validated as a dict of the parameterized key and value types, then wrapped
+        key, value = get_args(source) or (Any, Any)
+        return core_schema.no_info_after_validator_function(cls, handler.generate_schema(Dict[key, value]))
+
     def has(self, key: K) -> bool:
         return key in self
     
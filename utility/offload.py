@@ -0,0 +1,102 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+from typing import Callable, Literal, Optional
+
+from .env import get_env
+from .logger import get_logger
+from .prometheus import metrics
+
+__all__ = (
+    "Offloader",
+    "offloader",
+)
+
+logger = get_logger()
+
+type ExecutorKind = Literal["thread", "process", "none"]
+
+# Each bot worker gets its own pool, so one per core would start workers × cores processes
+DEFAULT_PROCESS_WORKERS = 2
+
+_calls = metrics.counter("peerless_offload_calls", "Validation and serialization calls by where they ran", ["operation", "path"])
+_pool_seconds = metrics.histogram("peerless_offload_seconds", "Time from handing work to the pool until it finished", ["operation"])
+
+class Offloader:
+    """Runs decoding, validation and serialization of large payloads in a worker pool.
+
+    Work is only sent to the pool once the payload reaches `min_bytes` of raw
+    data or `min_items` nested entries, since below that handing it over costs
+    more than doing it inline. JSON parsing and pydantic validation hold the
+    GIL, so in a thread they still stall the event loop, only in smaller
+    slices. Processes keep the loop free at the cost of pickling arguments and
+    results, which is why they are the default. Without `max_workers` a process
+    pool starts DEFAULT_PROCESS_WORKERS processes."""
+
+    def __init__(self, min_bytes: int=65536, min_items: int=256, executor: ExecutorKind="process", max_workers: Optional[int]=None) -> None:
+        if executor not in ("thread", "process", "none"):
+            raise ValueError(f"Unknown offload executor {executor!r}, expected 'thread', 'process' or 'none'")
+
+        self.min_bytes = min_bytes
+        self.min_items = min_items
+        self.executor = executor
+        self.max_workers = max_workers
+
+        self._pool: Optional[concurrent.futures.Executor] = None
+
+    @classmethod
+    def from_env(cls) -> 'Offloader':
+        """Configured by OFFLOAD_EXECUTOR, OFFLOAD_MIN_BYTES, OFFLOAD_MIN_ITEMS and OFFLOAD_WORKERS."""
+
+        workers = get_env("OFFLOAD_WORKERS", "")
+        return cls(
+            min_bytes=int(get_env("OFFLOAD_MIN_BYTES", "") or 65536),
+            min_items=int(get_env("OFFLOAD_MIN_ITEMS", "") or 256),
+            executor=get_env("OFFLOAD_EXECUTOR", "") or "process", # type: ignore
+            max_workers=int(workers) if workers else None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.executor != "none"
+
+    def should_offload(self, *, size: int=0, items: int=0) -> bool:
+        return self.enabled and ((self.min_bytes > 0 and size >= self.min_bytes) or (self.min_items > 0 and items >= self.min_items))
+
+    async def run[*A, R](self, operation: str, func: Callable[[*A], R], *args: *A, size: int=0, items: int=0) -> R:
+        """Call `func(*args)`, in the pool if the payload is over the threshold.
+
+        In process mode `func`, its arguments and its result must be picklable."""
+
+        if not self.should_offload(size=size, items=items):
+            _calls.labels(operation=operation, path="inline").inc()
+            return func(*args)
+
+        _calls.labels(operation=operation, path="pool").inc()
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            return await loop.run_in_executor(self._get_pool(), func, *args)
+        finally:
+            _pool_seconds.labels(operation=operation).observe(loop.time() - start)
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            if self.executor == "process":
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers or DEFAULT_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix="peerless-offload")
+
+            logger.info("Started %s pool for offloaded validation and serialization", self.executor)
+
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+offloader = Offloader.from_env()
@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import os
+import time
+from bisect import bisect_left
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from .logger import get_logger
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "timed",
+)
+
+logger = get_logger()
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str="") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """A monotonically increasing value."""
+
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels: Tuple[Tuple[str, str], ...]=()) -> None:
+        self.labels = labels
+        self.value = 0.0
+
+    def inc(self, amount: float=1.0) -> None:
+        self.value += amount
+
+    def samples(self, name: str) -> Iterator[str]:
+        yield f"{name}_total{_format_labels(self.labels)} {self.value}"
+
+class Gauge:
+    """A value that can go up and down, such as the number of in-flight calls."""
+
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels: Tuple[Tuple[str, str], ...]=()) -> None:
+        self.labels = labels
+        self.value = 0.0
+
+    def inc(self, amount: float=1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float=1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name: str) -> Iterator[str]:
+        yield f"{name}{_format_labels(self.labels)} {self.value}"
+
+class Histogram:
+    """Fixed bucket histogram. Observing only increments preallocated counters."""
+
+    __slots__ = ("labels", "buckets", "counts", "sum", "count")
+
+    def __init__(self, labels: Tuple[Tuple[str, str], ...]=(), buckets: Sequence[float]=DEFAULT_BUCKETS) -> None:
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            yield f"{name}_bucket{_format_labels(self.labels, le)} {cumulative}"
+
+        le = 'le="+Inf"'
+        yield f"{name}_bucket{_format_labels(self.labels, le)} {self.count}"
+        yield f"{name}_sum{_format_labels(self.labels)} {self.sum}"
+        yield f"{name}_count{_format_labels(self.labels)} {self.count}"
+
+class Family[M: (Counter, Gauge, Histogram)]:
+    """A named metric with a fixed set of label names.
+
+    Children are created once per label combination and should be bound at
+    import time, so the hot path only touches the child itself."""
+
+    def __init__(self, kind: Type[M], name: str, documentation: str, labelnames: Sequence[str], **kwargs: Any) -> None:
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kwargs = kwargs
+
+        self.children: Dict[Tuple[str, ...], M] = {}
+
+    def labels(self, **labels: Any) -> M:
+        values = tuple(str(labels[name]) for name in self.labelnames)
+
+        if (child := self.children.get(values)) is None:
+            child = self.kind(tuple(zip(self.labelnames, values)), **self.kwargs)
+            self.children[values] = child
+
+        return child
+
+    def render(self) -> Iterator[str]:
+        kind = self.kind.__name__.lower()
+
+        # Counter samples are suffixed with _total, and HELP and TYPE have to name the sample
+        name = f"{self.name}_total" if self.kind is Counter else self.name
+        yield f"# HELP {name} {self.documentation}"
+        yield f"# TYPE {name} {kind}"
+
+        for child in self.children.values():
+            yield from child.samples(self.name)
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.families: Dict[str, Family[Any]] = {}
+        self._server: Optional[asyncio.Server] = None
+
+    def _register[M: (Counter, Gauge, Histogram)](self, kind: Type[M], name: str, documentation: str, labelnames: Sequence[str], **kwargs: Any) -> Family[M]:
+        if name in self.families:
+            return self.families[name]
+
+        family = Family(kind, name, documentation, labelnames, **kwargs)
+        self.families[name] = family
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str]=()) -> Family[Counter]:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str]=()) -> Family[Gauge]:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str]=(), buckets: Sequence[float]=DEFAULT_BUCKETS) -> Family[Histogram]:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+
+        lines: List[str] = []
+        for family in self.families.values():
+            lines.extend(family.render())
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically write the current metrics to a file (e.g. for the node_exporter textfile collector)."""
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.render())
+
+        os.replace(tmp_path, path)
+
+    async def export_to_file(self, path: str, interval: float=15.0) -> None:
+        """Rewrite the metrics file every `interval` seconds until cancelled."""
+
+        while True:
+            await asyncio.to_thread(self.write, path)
+            await asyncio.sleep(interval)
+
+    async def serve(self, host: str="0.0.0.0", port: int=9100) -> None:
+        """Serve the metrics over HTTP for Prometheus to scrape."""
+
+        if self._server:
+            return
+
+        self._server = await asyncio.start_server(self._handle_scrape, host, port)
+        logger.info(f"Serving metrics on {host}:{port}")
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.render().encode()
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+metrics = MetricsRegistry()
+
+def timed[**P, R](histogram: Histogram, in_flight: Optional[Gauge]=None) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Record the duration of every call to an async function, and optionally track calls in flight."""
+
+    def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if in_flight:
+                in_flight.inc()
+
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+                if in_flight:
+                    in_flight.dec()
+
+        return wrapper
+    return decorator
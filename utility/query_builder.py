@@ -1,4 +1,4 @@
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 class Query:
@@ -13,17 +13,26 @@ class Query:
         return query.strip(), list(values.values())
 
     @staticmethod
-    def update(table: str, values: Dict[str, Any], where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    def update(table: str, values: Dict[str, Any], where: Dict[str, Any], settings: Optional[Dict[str, str]]=None) -> Tuple[str, List[Any]]:
         set_expr = ', '.join(f"{key}=${i+1}" for i, key in enumerate(values))
         where_expr = ' AND '.join(f"{key}=${i+len(values)+1}" for i, key in enumerate(where))
+        args = list(values.values()) + list(where.values())
+
+        # Transaction-local settings, set before any row is updated so the row triggers can read them
+        from_expr = ""
+        if settings:
+            configs = ', '.join(f"set_config('{name}', ${i+len(args)+1}, true)" for i, name in enumerate(settings))
+            from_expr = f"FROM (SELECT {configs}) AS peerless_settings"
+            args += list(settings.values())
 
         query = f"""
             UPDATE {table}
             SET {set_expr}
+            {from_expr}
             WHERE {where_expr}
         """
 
-        return query.strip(), list(values.values()) + list(where.values())
+        return query.strip(), args
 
     @staticmethod
     def delete(table: str, where: Dict[str, Any]) -> Tuple[str, List[Any]]:
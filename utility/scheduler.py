@@ -0,0 +1,297 @@
+import asyncio
+import datetime
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from .cache import value_keys
+from .env import get_env
+from .logger import get_logger
+from .models import DEFAULT_DEMANDS, DemandData, PlayerLeagueData, SuspensionData
+from .prometheus import metrics
+from .schema import Table
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = (
+    "Scheduler",
+)
+
+logger = get_logger()
+
+DEMANDS = "demands"
+SUSPENSIONS = "suspensions"
+
+SCHEDULE_KEYS = {
+    DEMANDS: "schedule:demands",
+    SUSPENSIONS: "schedule:suspensions",
+}
+BACKFILL_KEY = "schedule:backfilled"
+
+# Held while one process backfills, so a crashed one doesn't block the others for good
+BACKFILL_LOCK_TTL = 600
+# The schedule is rebuilt this often, in case Redis lost part of it
+BACKFILL_EXPIRY = 86400
+
+# Claimed items return to the schedule if the worker that claimed them hasn't finished by then
+CLAIM_TIMEOUT = 60.0
+
+# Due members move to a processing set until the worker that claimed them has applied them,
+# so several processes can poll the same schedule and a crash doesn't lose anything
+CLAIM_DUE_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(stale) do
+    redis.call('ZADD', KEYS[1], 'NX', ARGV[1], member)
+    redis.call('ZREM', KEYS[2], member)
+end
+
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[1] + ARGV[3], member)
+end
+return due
+"""
+
+EXPIRE_DEMANDS = f"""
+    UPDATE {Table.PLAYER_LEAGUES.value} AS pl
+    SET demands = jsonb_set(pl.demands, '{{remaining}}', to_jsonb($3::int))
+    FROM unnest($1::bigint[], $2::bigint[]) AS due(player_id, league_id)
+    WHERE pl.player_id = due.player_id AND pl.league_id = due.league_id
+      AND (pl.demands->>'remaining')::int < $3
+      AND (pl.demands->>'available_at')::timestamptz <= now()
+    RETURNING pl.player_id, pl.league_id
+"""
+
+EXPIRE_SUSPENSIONS = f"""
+    UPDATE {Table.PLAYER_LEAGUES.value} AS pl
+    SET suspension = NULL
+    FROM unnest($1::bigint[], $2::bigint[]) AS due(player_id, league_id)
+    WHERE pl.player_id = due.player_id AND pl.league_id = due.league_id
+      AND NOT (pl.suspension->>'banned')::boolean
+      AND (pl.suspension->>'until')::timestamptz <= now()
+    RETURNING pl.player_id, pl.league_id
+"""
+
+BACKFILL = f"""
+    SELECT player_id, league_id, demands, suspension FROM {Table.PLAYER_LEAGUES.value}
+    WHERE (demands->>'remaining')::int < $1
+       OR (suspension IS NOT NULL AND NOT (suspension->>'banned')::boolean)
+"""
+
+_demands = TypeAdapter(DemandData)
+_suspension = TypeAdapter(SuspensionData)
+
+_expired = metrics.counter("peerless_scheduler_expired", "Demand cooldowns and suspensions that were expired", ["kind"])
+_pending = metrics.gauge("peerless_scheduler_pending", "Items waiting in the schedule", ["kind"])
+
+def _score(due: datetime.datetime) -> float:
+    # Naive timestamps are read as UTC, the same as the database session
+    if due.tzinfo is None:
+        due = due.replace(tzinfo=datetime.timezone.utc)
+    return due.timestamp()
+
+def _member(player_id: int, league_id: int) -> str:
+    return f"{player_id}:{league_id}"
+
+def _parse_member(member: Any) -> Tuple[int, int]:
+    if isinstance(member, bytes):
+        member = member.decode()
+
+    player_id, league_id = member.split(":")
+    return int(player_id), int(league_id)
+
+def _due_times(demands: Optional[DemandData], suspension: Optional[SuspensionData]) -> Dict[str, Optional[float]]:
+    """When each kind of expiry is due for a player, or None if nothing is scheduled."""
+
+    return {
+        DEMANDS: _score(demands.available_at) if demands and demands.remaining < DEFAULT_DEMANDS else None,
+        SUSPENSIONS: _score(suspension.until) if suspension and not suspension.banned else None,
+    }
+
+class Scheduler:
+    """Expires demand cooldowns and suspensions when they are due.
+
+    Due times live in Redis sorted sets, scored by timestamp, and are kept in
+    sync whenever Database writes a player's demands or suspension. Workers
+    atomically claim whatever is due in batches and apply it with one UPDATE per
+    batch, so nothing has to scan the player_leagues table. A batch is only
+    removed once applied, and the UPDATEs are safe to repeat, so a batch whose
+    worker died is claimed again after CLAIM_TIMEOUT. Bans never expire."""
+
+    def __init__(self, db: 'Database', interval: Optional[float]=None, batch_size: int=500) -> None:
+        self.db = db
+        self.interval = interval if interval is not None else float(get_env("SCHEDULER_INTERVAL", "") or 1.0)
+        self.batch_size = batch_size
+
+        self._claim_due = db.cache.redis.register_script(CLAIM_DUE_SCRIPT)
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        if self._task or self.interval <= 0:
+            return
+
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def sync(self, player_league_data: PlayerLeagueData, keys: Iterable[str]) -> None:
+        """Schedule or unschedule a player's expiries after `keys` of it were written."""
+
+        keys = set(keys)
+        if not keys & {"demands", "suspension"}:
+            return
+
+        # Read the fields directly, since unset ones raise on attribute access
+        fields = player_league_data.__dict__
+        due = _due_times(
+            fields.get("demands") if "demands" in keys else None,
+            fields.get("suspension") if "suspension" in keys else None,
+        )
+        member = _member(player_league_data.player_id, player_league_data.league_id)
+
+        async with self.db.cache.redis.pipeline(transaction=False) as pipe:
+            for kind, field in ((DEMANDS, "demands"), (SUSPENSIONS, "suspension")):
+                if field not in keys:
+                    continue
+
+                if (score := due[kind]) is not None:
+                    pipe.zadd(SCHEDULE_KEYS[kind], {member: score})
+                else:
+                    pipe.zrem(SCHEDULE_KEYS[kind], member)
+
+            await pipe.execute()
+
+    async def backfill(self) -> int:
+        """Schedule every row with a pending expiry. Repeated every BACKFILL_EXPIRY in case Redis lost the schedule."""
+
+        count = 0
+        async with self.db.pool.acquire() as con:
+            async with con.transaction():
+                cursor = con.cursor(BACKFILL, DEFAULT_DEMANDS, prefetch=self.batch_size)
+                batch: Dict[str, Dict[str, float]] = {DEMANDS: {}, SUSPENSIONS: {}}
+
+                async for row in cursor:
+                    try:
+                        due = _due_times(
+                            _demands.validate_python(row["demands"]) if row["demands"] else None,
+                            _suspension.validate_python(row["suspension"]) if row["suspension"] else None,
+                        )
+                    except ValidationError:
+                        logger.warning(f"Skipping unreadable player league {row['player_id']}:{row['league_id']}")
+                        continue
+
+                    for kind, score in due.items():
+                        if score is not None:
+                            batch[kind][_member(row["player_id"], row["league_id"])] = score
+
+                    count += 1
+                    if count % self.batch_size == 0:
+                        await self._add(batch)
+
+                await self._add(batch)
+
+        logger.info(f"Backfilled the schedule from {count} player leagues")
+        return count
+
+    async def _add(self, batch: Dict[str, Dict[str, float]]) -> None:
+        for kind, members in batch.items():
+            if members:
+                await self.db.cache.redis.zadd(SCHEDULE_KEYS[kind], members)
+                members.clear()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # Checked on every pass, so whichever process sees the key expire first rebuilds the schedule
+                await self._backfill_if_due()
+
+                busy = False
+                for kind in (DEMANDS, SUSPENSIONS):
+                    busy |= await self.process(kind) == self.batch_size
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to process the schedule", exc_info=e)
+                busy = False
+
+            # A full batch means more is probably due, so keep going without waiting
+            if not busy:
+                await asyncio.sleep(self.interval)
+
+    async def _backfill_if_due(self) -> None:
+        if not await self.db.cache.redis.set(BACKFILL_KEY, "running", nx=True, ex=BACKFILL_LOCK_TTL):
+            return
+
+        try:
+            await self.backfill()
+            await self.db.cache.redis.set(BACKFILL_KEY, "done", ex=BACKFILL_EXPIRY)
+        except Exception as e:
+            # Let the next pass, here or in another process, retry it
+            await self.db.cache.redis.delete(BACKFILL_KEY)
+            logger.error("Failed to backfill the schedule", exc_info=e)
+
+    async def process(self, kind: str) -> int:
+        """Claim and apply one batch of due items. Returns how many were claimed."""
+
+        key = SCHEDULE_KEYS[kind]
+        processing = f"{key}:processing"
+        members: List[Any] = await self._claim_due(keys=[key, processing], args=[time.time(), self.batch_size, CLAIM_TIMEOUT])
+
+        if not members:
+            _pending.labels(kind=kind).set(await self.db.cache.redis.zcard(key))
+            return 0
+
+        due = [_parse_member(member) for member in members]
+
+        try:
+            expired = await self.apply(kind, due)
+        except Exception:
+            # Put them back to retry on the next pass, unless they were rescheduled meanwhile
+            async with self.db.cache.redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {member: time.time() + self.interval for member in members}, nx=True)
+                pipe.zrem(processing, *members)
+                await pipe.execute()
+            raise
+
+        await self.db.cache.redis.zrem(processing, *members)
+
+        _expired.labels(kind=kind).inc(len(expired))
+        logger.debug("Expired %d of %d due %s", len(expired), len(due), kind)
+        return len(members)
+
+    async def apply(self, kind: str, due: List[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+        """Expire a batch in the database and drop the stale fields from the hash cache."""
+
+        player_ids = [player_id for player_id, _ in due]
+        league_ids = [league_id for _, league_id in due]
+
+        if kind == DEMANDS:
+            rows = await self.db.pool.fetch(EXPIRE_DEMANDS, player_ids, league_ids, DEFAULT_DEMANDS)
+            field = "demands"
+        else:
+            rows = await self.db.pool.fetch(EXPIRE_SUSPENSIONS, player_ids, league_ids)
+            field = "suspension"
+
+        expired = {(row["player_id"], row["league_id"]) for row in rows}
+        if not expired:
+            return expired
+
+        async with self.db.cache.redis.pipeline(transaction=False) as pipe:
+            for player_id, league_id in expired:
+                for name in value_keys(f"playerleaguedata:{player_id}:{league_id}"):
+                    pipe.hdel(name, field)
+            await pipe.execute()
+
+        return expired
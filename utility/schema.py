@@ -1,6 +1,7 @@
 import datetime
+import functools
 from enum import Enum
-from typing import List
+from typing import FrozenSet, List, Tuple
 
 from sqlalchemy import (
     BigInteger,
@@ -60,6 +61,22 @@ class PlayerLeagueTable(Base):
     waitlisted_at: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     blacklisted: Mapped[bool] = mapped_column(Boolean, default=False)
 
+@functools.cache
+def column_names(table: Table) -> Tuple[str, ...]:
+    """Names of the columns in `table`, in table order."""
+
+    return tuple(column.name for column in Base.metadata.tables[table.value].columns)
+
+@functools.cache
+def jsonb_columns(table: Table) -> FrozenSet[str]:
+    """Names of the JSONB columns in `table`."""
+
+    return frozenset(
+        column.name
+        for column in Base.metadata.tables[table.value].columns
+        if isinstance(column.type, JSONB)
+    )
+
 def create_missing_tables(missing_tables: List[str]) -> None:
     engine = create_engine(get_env("DATABASE_URL"), echo=False)
 
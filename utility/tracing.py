@@ -0,0 +1,190 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+from .ipcmodels import TraceContext
+
+__all__ = (
+    "Span",
+    "Tracer",
+    "tracer",
+    "traced",
+)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("peerless_current_span", default=None)
+_NULL_CONTEXT: ContextManager[None] = contextlib.nullcontext()
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], start_ns: int, attributes: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes
+
+    def context(self) -> TraceContext:
+        return TraceContext(trace_id=self.trace_id, span_id=self.span_id, sent_at=time.time_ns())
+
+    def to_otel(self, service: str) -> Dict[str, Any]:
+        """Convert the span to the OTLP JSON span shape."""
+
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in ({"service.name": service} | self.attributes).items()
+            ],
+        }
+
+class Tracer:
+    """Records spans as OpenTelemetry-compatible JSON lines.
+
+    Tracing is disabled unless a file path is given (TRACE_FILE), in which case
+    `span` returns a shared no-op context manager. Finished spans are handed to
+    a writer thread in batches, so the event loop never waits on the file."""
+
+    def __init__(self, path: Optional[str]=None, service: str="peerless", flush_every: int=64) -> None:
+        self.path = path
+        self.service = service
+        self.flush_every = flush_every
+
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[Optional[List[Span]]] = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+        if path:
+            atexit.register(self.flush)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def context(self) -> Optional[TraceContext]:
+        """The trace context to propagate to another process, if a span is active."""
+
+        span = _current_span.get()
+        return span.context() if span else None
+
+    def span(self, name: str, *, parent: Optional[TraceContext]=None, **attributes: Any) -> ContextManager[Optional[Span]]:
+        """Start a span as a child of `parent`, or of the current span if there is no parent."""
+
+        if not self.path:
+            return _NULL_CONTEXT
+        return self._span(name, parent, attributes)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, parent: Optional[TraceContext], attributes: Dict[str, Any]) -> Iterator[Span]:
+        if parent:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif current := _current_span.get():
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = _new_id(16), None
+
+        span = Span(name, trace_id, parent_id, time.time_ns(), attributes)
+        token = _current_span.set(span)
+
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.record(span)
+
+    def record_interval(self, name: str, parent: TraceContext, start_ns: int, end_ns: int, **attributes: Any) -> None:
+        """Record a span that was measured elsewhere, such as the time a message spent queued."""
+
+        if not self.path:
+            return
+
+        span = Span(name, parent.trace_id, parent.span_id, start_ns, attributes)
+        span.end_ns = end_ns
+        self.record(span)
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self.flush_every:
+                return
+
+            spans, self._buffer = self._buffer, []
+
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="peerless-tracer", daemon=True)
+                self._writer.start()
+
+        self._queue.put(spans)
+
+    def flush(self) -> None:
+        """Write the buffered spans and wait for the writer thread to finish."""
+
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+            writer, self._writer = self._writer, None
+
+        if writer:
+            self._queue.put(spans)
+            self._queue.put(None)
+            writer.join()
+        elif spans:
+            self._write(spans)
+
+    def _run_writer(self) -> None:
+        while (spans := self._queue.get()) is not None:
+            self._write(spans)
+
+    def _write(self, spans: List[Span]) -> None:
+        if not self.path:
+            return
+
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(span.to_otel(self.service)) + "\n" for span in spans)
+
+tracer = Tracer(os.getenv("TRACE_FILE"), service=os.getenv("TRACE_SERVICE", "peerless"))
+
+def traced[**P, R](name: str) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Run every call to an async function inside a span named `name`."""
+
+    def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+    return decorator